@@ -0,0 +1,32 @@
+import json
+import os
+
+# Reads the runner's account config (see accounts.example.json) without
+# building any bots, so the review console and metrics can use it too.
+
+ACCOUNTS_FILE = os.getenv('ACCOUNTS_FILE', 'accounts.json')
+
+
+def account_db(entry):
+    return entry.get('db', f"{entry['name']}.db")
+
+
+def load_account_entries(path=ACCOUNTS_FILE, enabled_only=True):
+    with open(path, 'r') as f:
+        config = json.load(f)
+    accounts = [entry for entry in config['accounts'] if entry.get('enabled', True) or not enabled_only]
+    names = [entry['name'] for entry in accounts]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate account names in {path}")
+    dbs = [account_db(entry) for entry in accounts]
+    if len(set(dbs)) != len(dbs):
+        raise ValueError(f"Each account needs its own db in {path}")
+    return accounts, config.get('stagger', 60)
+
+
+def account_dbs(path=ACCOUNTS_FILE):
+    # Every listed account's db, disabled ones included since their past
+    # tweets still count; just tweets.db when there is no config file
+    if not os.path.exists(path):
+        return ['tweets.db']
+    return [account_db(entry) for entry in load_account_entries(path, enabled_only=False)[0]]
@@ -0,0 +1,109 @@
+import json
+import logging
+import sqlite3
+import zlib
+
+
+class TweetArchive:
+    """Append-only archive of posted tweets in a separate SQLite file.
+
+    Tweets are stored in zlib-compressed JSON blocks of a few hundred rows, so
+    history costs a fraction of the hot table's disk space. Blocks are only
+    decompressed when read.
+    """
+    COMPRESSION_LEVEL = 9
+
+    def __init__(self, manager):
+        # manager is the db_operations.ConnectionManager for the archive file
+        self.manager = manager.acquire()
+        self.manager.ensure_schema(self.create_tables)
+
+    @property
+    def conn(self):
+        return self.manager.connection()
+
+    def create_tables(self):
+        self.conn.executescript('''
+        CREATE TABLE IF NOT EXISTS blocks
+        (id INTEGER PRIMARY KEY AUTOINCREMENT,
+         row_count INTEGER NOT NULL,
+         first_posted_at TIMESTAMP,
+         last_posted_at TIMESTAMP,
+         archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+         data BLOB NOT NULL);
+        CREATE TABLE IF NOT EXISTS archived_tweets
+        (tweet_id INTEGER PRIMARY KEY,
+         block_id INTEGER NOT NULL);
+        ''')
+
+    def append(self, rows):
+        # rows are (id, content, created_at, posted_at). Rows already archived
+        # are skipped, so re-running after a crash between the archive write
+        # and the hot-table delete doesn't store them twice.
+        conn = self.conn
+        ids = [row[0] for row in rows]
+        existing = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            existing.update(r[0] for r in conn.execute(
+                f"SELECT tweet_id FROM archived_tweets WHERE tweet_id IN ({placeholders})", chunk))
+        rows = [list(row) for row in rows if row[0] not in existing]
+        if not rows:
+            return 0
+        data = zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'), self.COMPRESSION_LEVEL)
+        posted = sorted(str(row[3]) for row in rows if row[3] is not None)
+        try:
+            cursor = conn.execute(
+                "INSERT INTO blocks (row_count, first_posted_at, last_posted_at, data) VALUES (?, ?, ?, ?)",
+                (len(rows), posted[0] if posted else None, posted[-1] if posted else None, data))
+            block_id = cursor.lastrowid
+            conn.executemany("INSERT INTO archived_tweets (tweet_id, block_id) VALUES (?, ?)",
+                             [(row[0], block_id) for row in rows])
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        return len(rows)
+
+    def read_block(self, block_id):
+        row = self.conn.execute("SELECT data FROM blocks WHERE id = ?", (block_id,)).fetchone()
+        return [tuple(r) for r in json.loads(zlib.decompress(row[0]))] if row else []
+
+    def iter_tweets(self):
+        # Lazily decompresses one block at a time, oldest first
+        last_id = 0
+        while True:
+            row = self.conn.execute("SELECT id FROM blocks WHERE id > ? ORDER BY id LIMIT 1", (last_id,)).fetchone()
+            if row is None:
+                return
+            last_id = row[0]
+            yield from self.read_block(last_id)
+
+    def get_tweet(self, tweet_id):
+        row = self.conn.execute("SELECT block_id FROM archived_tweets WHERE tweet_id = ?", (tweet_id,)).fetchone()
+        if row is None:
+            return None
+        return next((r for r in self.read_block(row[0]) if r[0] == tweet_id), None)
+
+    def count_since(self, posted_after, created_after=None):
+        # Archived tweets posted at or after posted_after (and created at or
+        # after created_after, if given); only blocks ending later are read
+        count = 0
+        blocks = self.conn.execute("SELECT id FROM blocks WHERE last_posted_at >= ?", (posted_after,)).fetchall()
+        for (block_id,) in blocks:
+            count += sum(1 for _, _, created_at, posted_at in self.read_block(block_id)
+                         if posted_at is not None and str(posted_at) >= posted_after
+                         and (created_after is None or str(created_at) >= created_after))
+        return count
+
+    def stats(self):
+        blocks, rows, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(row_count), 0), COALESCE(SUM(LENGTH(data)), 0) FROM blocks").fetchone()
+        return {'blocks': blocks, 'tweets': rows, 'compressed_bytes': size}
+
+    def close(self):
+        try:
+            self.manager.release()
+        except sqlite3.Error as e:
+            logging.error(f"Error closing archive: {e}")
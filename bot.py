@@ -0,0 +1,308 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+
+import requests
+
+from config import AnsiColor
+from db_operations import DBOperations
+from media_store import media_store
+from openai_api import OpenAIClient
+from producer import TweetProducer
+from scheduler import Scheduler
+from resilience import CircuitOpenError
+from topics import TopicTracker
+from x_client import XClient
+import tweet_validator
+
+MAINTENANCE_INTERVAL = 24 * 3600
+# Upload progress is reused for this long; X expires media ids after a day
+UPLOAD_STATE_TTL = 12 * 3600
+
+
+class AccountLog(logging.LoggerAdapter):
+    # Prefixes every message with the account name
+    def process(self, msg, kwargs):
+        return f"[{self.extra['account']}] {msg}", kwargs
+
+
+class XBot:
+    """One X account: its own credentials, persona, tweet queue and schedule.
+
+    Each account keeps its queue, topic history and archive in its own
+    database file. The HTTP pool, OpenAI client, response cache and prompt
+    registry are process-wide, so many bots can share one event loop; the
+    XClient shares the HTTP pool but has per-account X rate limits.
+    """
+
+    def __init__(self, name='cerberus', persona=None, db_name='tweets.db', credentials_prefix='X_',
+                 candidates=1, low_watermark=5, high_watermark=20, post_interval=(7200, 14400),
+                 image_chance=0.1, media_interval=60, max_post_attempts=3, lease_seconds=900,
+                 schedule_overrides=None):
+        self.name = name
+        self.persona = persona
+        self.db = DBOperations(db_name)
+        self.topics = TopicTracker(db_name)
+        self.x = XClient.from_env(credentials_prefix, name)
+        self.candidates = candidates
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.post_interval = tuple(post_interval)
+        self.image_chance = image_chance
+        self.media_interval = media_interval
+        self.max_post_attempts = max_post_attempts
+        self.lease_seconds = lease_seconds
+        # job name -> Scheduler.add options, e.g. {'cleanup': {'interval': 3600}}
+        self.schedule_overrides = schedule_overrides or {}
+        self.scheduler = None
+        # Identifies this process and account as the holder of posting leases
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{name}"
+        self.uploads = {}  # media_hash -> XClient.upload_media state, kept across post attempts
+        media_store.add_pin_source(self.db.get_pinned_media)
+        self.log = AccountLog(logging.getLogger(), {'account': name})
+
+    @classmethod
+    def from_env(cls):
+        # Single-account settings, as main.py has always read them
+        return cls(candidates=int(os.getenv('TWEET_CANDIDATES', '1')),
+                   low_watermark=int(os.getenv('PENDING_LOW_WATERMARK', '5')),
+                   high_watermark=int(os.getenv('PENDING_HIGH_WATERMARK', '20')))
+
+    @classmethod
+    def from_config(cls, entry):
+        # entry is one account from the runner's config file
+        name = entry['name']
+        return cls(name=name, persona=entry.get('persona', name), db_name=entry.get('db', f'{name}.db'),
+                   credentials_prefix=entry.get('credentials_prefix', f'X_{name.upper()}_'),
+                   candidates=entry.get('candidates', 1), low_watermark=entry.get('low_watermark', 5),
+                   high_watermark=entry.get('high_watermark', 20),
+                   post_interval=entry.get('post_interval', (7200, 14400)),
+                   image_chance=entry.get('image_chance', 0.1), media_interval=entry.get('media_interval', 60),
+                   max_post_attempts=entry.get('max_post_attempts', 3),
+                   lease_seconds=entry.get('lease_seconds', 900), schedule_overrides=entry.get('schedule'))
+
+    def check_tweet(self, text):
+        # Pre-flight check so over-length posts never cost a round trip
+        if tweet_validator.validate(text):
+            text = tweet_validator.fit(text)
+            self.log.warning(f"{AnsiColor.WARNING}Tweet trimmed to fit before posting: {text}{AnsiColor.ENDC}")
+        return text, tweet_validator.validate(text)
+
+    def post_tweet(self, text):
+        text, problem = self.check_tweet(text)
+        if problem:
+            return {"error": "invalid", "message": problem}
+        try:
+            response = self.x.post_tweet(text)
+        except (CircuitOpenError, requests.RequestException) as e:
+            self.log.error(f"{AnsiColor.FAIL}Tweet not sent: {e}{AnsiColor.ENDC}")
+            return {"error": type(e).__name__, "message": str(e)}
+        self.log.info(f"{AnsiColor.OKGREEN}API Response: {response.text}{AnsiColor.ENDC}")
+        return response.json() if response.status_code == 201 else {"error": response.status_code, "message": response.text}
+
+    def upload_state(self, media_hash):
+        # A retried post resumes its image upload, or reuses the finished
+        # media_id, instead of uploading again
+        now = time.time()
+        for stale in [key for key, state in self.uploads.items() if now - state['started'] > UPLOAD_STATE_TTL]:
+            del self.uploads[stale]
+        return self.uploads.setdefault(media_hash, {'started': now})
+
+    def post_tweet_with_media(self, text, media_hash, media_type):
+        text, problem = self.check_tweet(text)
+        if problem:
+            return {"error": "invalid", "message": problem}
+        stored = media_store.open(media_hash)
+        if stored is None:
+            self.log.warning(f"{AnsiColor.WARNING}Image {media_hash} is no longer stored, posting without it{AnsiColor.ENDC}")
+            return self.post_tweet(text)
+        # First, upload the image from the media store in chunks
+        media, size = stored
+        try:
+            with media:
+                media_id = self.x.upload_media(media, size, media_type, self.upload_state(media_hash))
+        except (CircuitOpenError, requests.RequestException) as e:
+            self.log.error(f"{AnsiColor.FAIL}Failed to upload image: {e}{AnsiColor.ENDC}")
+            return {"error": type(e).__name__, "message": str(e)}
+
+        # Now, post the tweet with the image
+        try:
+            response = self.x.post_tweet(text, [media_id])
+        except (CircuitOpenError, requests.RequestException) as e:
+            self.log.error(f"{AnsiColor.FAIL}Tweet not sent: {e}{AnsiColor.ENDC}")
+            return {"error": type(e).__name__, "message": str(e)}
+        self.log.info(f"{AnsiColor.OKGREEN}API Response: {response.text}{AnsiColor.ENDC}")
+        if response.status_code == 201:
+            self.uploads.pop(media_hash, None)
+            return response.json()
+        return {"error": response.status_code, "message": response.text}
+
+    def generate_and_store_tweet(self):
+        # Runs on a producer worker thread; returns the number of tweets stored
+        if self.candidates > 1:
+            return self.generate_and_store_candidates(self.candidates)
+
+        self.log.info(f"{AnsiColor.OKBLUE}Generating tweet content...{AnsiColor.ENDC}")
+        tweet_content = OpenAIClient.generate_tweet_with_hashtags(self.persona, self.topics)
+
+        if tweet_content:
+            self.log.info(f"{AnsiColor.OKGREEN}Generated content: {tweet_content}{AnsiColor.ENDC}")
+            tweet_id = self.db.add_tweet(tweet_content)
+            if tweet_id:
+                self.log.info(f"{AnsiColor.OKGREEN}Tweet stored in database with ID: {tweet_id}{AnsiColor.ENDC}")
+                return 1
+            else:
+                self.log.error(f"{AnsiColor.FAIL}Failed to store tweet in database{AnsiColor.ENDC}")
+        else:
+            self.log.error(f"{AnsiColor.FAIL}Failed to generate tweet content{AnsiColor.ENDC}")
+        return 0
+
+    def generate_and_store_candidates(self, candidates):
+        self.log.info(f"{AnsiColor.OKBLUE}Generating {candidates} tweet candidates in one request...{AnsiColor.ENDC}")
+        tweets, prompt_tokens = OpenAIClient.generate_candidates_with_hashtags(candidates, self.persona, self.topics)
+
+        if tweets:
+            for tweet_content in tweets:
+                self.log.info(f"{AnsiColor.OKGREEN}Generated content: {tweet_content}{AnsiColor.ENDC}")
+            stored = self.db.bulk_add_tweets(tweets)
+            per_tweet = prompt_tokens / stored if stored else prompt_tokens
+            self.log.info(f"{AnsiColor.OKGREEN}Stored {stored} of {len(tweets)} candidates "
+                          f"({per_tweet:.0f} prompt tokens per stored tweet){AnsiColor.ENDC}")
+            return stored
+        else:
+            self.log.error(f"{AnsiColor.FAIL}Failed to generate tweet content{AnsiColor.ENDC}")
+        return 0
+
+    def prefetch_media(self, limit=5):
+        # Decides on and fetches images for newly authorized tweets ahead of
+        # posting (image_chance of them get one). Runs on a worker thread;
+        # returns the number of tweets handled.
+        tweets = self.db.get_tweets_awaiting_media(limit)
+        for tweet_id, tweet_content in tweets:
+            if random.random() >= self.image_chance:
+                self.db.set_tweet_media(tweet_id, 'none')
+                continue
+            self.log.info(f"{AnsiColor.OKBLUE}Generating image for tweet {tweet_id}...{AnsiColor.ENDC}")
+            image_url = OpenAIClient.generate_image(tweet_content)
+            if not image_url:
+                self.log.error(f"{AnsiColor.FAIL}Failed to generate image, tweet {tweet_id} will post without one{AnsiColor.ENDC}")
+                self.db.set_tweet_media(tweet_id, 'failed')
+                continue
+            try:
+                media, _, media_type = self.x.download(image_url)
+                with media:
+                    media_hash = media_store.put(media)
+            except (CircuitOpenError, requests.RequestException, OSError) as e:
+                self.log.error(f"{AnsiColor.FAIL}Failed to download image for tweet {tweet_id}: {e}{AnsiColor.ENDC}")
+                self.db.set_tweet_media(tweet_id, 'failed')
+                continue
+            self.db.set_tweet_media(tweet_id, 'ready', media_hash, media_type)
+            self.log.info(f"{AnsiColor.OKGREEN}Image for tweet {tweet_id} stored as {media_hash}{AnsiColor.ENDC}")
+        return len(tweets)
+
+    @staticmethod
+    def is_duplicate_rejection(response):
+        # X refuses to publish the same text twice; for a tweet we may already
+        # have posted that is confirmation rather than failure
+        return response.get('error') == 403 and 'duplicate content' in str(response.get('message', '')).lower()
+
+    async def post_authorized_tweet(self):
+        # Leasing the tweet first means several workers (or processes) can
+        # drain one queue without posting anything twice
+        claim = self.db.claim_next_tweet(self.worker_id, self.lease_seconds, self.max_post_attempts)
+
+        if claim:
+            tweet_id, tweet_content, attempts, reclaimed = claim
+            if reclaimed:
+                self.log.warning(f"{AnsiColor.WARNING}Lease on tweet {tweet_id} expired mid-post; reconciling by "
+                                 f"posting again (X rejects it if it was already published){AnsiColor.ENDC}")
+            self.log.info(f"{AnsiColor.OKBLUE}Posting authorized tweet (attempt {attempts}): {tweet_content}{AnsiColor.ENDC}")
+
+            # Network calls (and their retries) run on worker threads so one
+            # account waiting on an API never holds up the others. Images were
+            # fetched ahead of time, so posting only uploads them. Whatever
+            # goes wrong, the claim is settled: completed or released.
+            try:
+                media = self.db.get_tweet_media(tweet_id)
+                if media:
+                    self.log.info(f"{AnsiColor.OKBLUE}Posting tweet with prefetched image {media[0]}.{AnsiColor.ENDC}")
+                    response = await asyncio.to_thread(self.post_tweet_with_media, tweet_content, *media)
+                else:
+                    self.log.info(f"{AnsiColor.OKBLUE}Posting tweet without image.{AnsiColor.ENDC}")
+                    response = await asyncio.to_thread(self.post_tweet, tweet_content)
+
+                if 'data' in response:
+                    self.log.info(f"{AnsiColor.OKGREEN}Tweet posted successfully: {tweet_content}{AnsiColor.ENDC}")
+                    self.db.complete_post(tweet_id, response['data'].get('id'))
+                elif self.is_duplicate_rejection(response):
+                    self.log.warning(f"{AnsiColor.WARNING}Tweet {tweet_id} is already on X; marking it posted{AnsiColor.ENDC}")
+                    self.db.complete_post(tweet_id)
+                else:
+                    status = self.db.release_tweet(tweet_id, self.worker_id, response, self.max_post_attempts,
+                                                   retry=response.get('error') != 'invalid')
+                    self.log.error(f"{AnsiColor.FAIL}Failed to post tweet ({status}): {response}{AnsiColor.ENDC}")
+            except Exception as e:
+                self.db.release_tweet(tweet_id, self.worker_id, e, self.max_post_attempts)
+                raise
+        else:
+            self.log.info(f"{AnsiColor.WARNING}No authorized tweets available to post{AnsiColor.ENDC}")
+
+    def log_maintenance_report(self, report):
+        self.log.info(f"{AnsiColor.OKGREEN}Background maintenance freed {report['pages_freed']} pages "
+                      f"in {report['seconds']:.2f}s{AnsiColor.ENDC}")
+
+    def schedule(self, start_delay=0):
+        # Each job has its own cadence, so a slow generation never delays a
+        # post. Options per job can be overridden from the account config.
+        producer = TweetProducer(self.db, self.generate_and_store_tweet, low_watermark=self.low_watermark,
+                                 high_watermark=self.high_watermark, log=self.log)
+
+        async def generate():
+            # Refill the pending buffer; back off on failure
+            try:
+                ok = await producer.refill()
+            except Exception as e:
+                self.log.error(f"{AnsiColor.FAIL}Error in tweet producer: {e}{AnsiColor.ENDC}", exc_info=True)
+                producer.failures += 1
+                ok = False
+            if not ok:
+                delay = producer.backoff_delay()
+                self.log.warning(f"{AnsiColor.WARNING}Tweet generation failed, retrying in {delay:.0f} seconds{AnsiColor.ENDC}")
+                return delay
+
+        async def prefetch():
+            await asyncio.to_thread(self.prefetch_media)
+
+        async def cleanup():
+            await asyncio.to_thread(self.db.cleanup_old_tweets)
+
+        async def maintenance():
+            # Vacuum and optimize on a background thread so posting is never blocked
+            thread = self.db.start_background_maintenance(on_complete=self.log_maintenance_report)
+            await asyncio.to_thread(thread.join)
+
+        low, high = self.post_interval
+        jobs = {
+            'post': (self.post_authorized_tweet, dict(interval=low, jitter=high - low, missed='run_once',
+                                                      initial_delay=start_delay)),
+            'generate': (generate, dict(interval=producer.poll_interval, jitter=30, missed='run_once')),
+            'prefetch_media': (prefetch, dict(interval=self.media_interval, jitter=5, missed='skip')),
+            'cleanup': (cleanup, dict(interval=6 * 3600, jitter=1800, missed='run_once')),
+            'maintenance': (maintenance, dict(interval=MAINTENANCE_INTERVAL, jitter=3600, missed='run_once',
+                                              initial_delay=MAINTENANCE_INTERVAL)),
+        }
+        scheduler = Scheduler(self.db, log=self.log)
+        for name, (action, options) in jobs.items():
+            scheduler.add(name, action, **dict(options, **self.schedule_overrides.get(name, {})))
+        return scheduler
+
+    async def run(self, start_delay=0):
+        self.db.connect()
+        self.scheduler = self.schedule(start_delay)
+        await self.scheduler.run()
+
+    def close(self):
+        self.db.close()
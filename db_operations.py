@@ -1,67 +1,506 @@
 import sqlite3
 import logging
-from datetime import datetime, timedelta
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import dedup
+import tweet_validator
+from archive import TweetArchive
+
+class ConnectionManager:
+    """Long-lived, per-thread SQLite connections for one database file.
+
+    Each thread gets its own connection (sqlite3 connections must not be shared
+    across threads), opened once with WAL journaling so the bot and the review
+    console can read and write the same file without blocking each other.
+    One manager is shared by every user of the file in the process; users
+    acquire() it and release() it when done, and the connections are closed
+    when the last one releases.
+    """
+    _managers = {}
+    _managers_lock = threading.Lock()
+
+    PRAGMAS = (
+        # Must come before journal_mode so it takes effect on a new file;
+        # existing files are converted once by perform_maintenance(convert=True)
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",  # fsync on checkpoint only; safe in WAL mode
+        "PRAGMA foreign_keys=ON",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-8000",  # ~8 MB page cache
+    )
+
+    def __init__(self, db_name, busy_timeout=5.0):
+        self.db_name = db_name
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        # Reentrant so ensure_schema can hold it while setup opens a connection
+        self._lock = threading.RLock()
+        self._connections = []
+        self._schemas_ready = set()  # setups already run, by qualified name
+        self._users = 0
+
+    @classmethod
+    def get(cls, db_name):
+        key = os.path.abspath(db_name) if db_name != ':memory:' else db_name
+        with cls._managers_lock:
+            manager = cls._managers.get(key)
+            if manager is None:
+                manager = cls(db_name)
+                cls._managers[key] = manager
+            return manager
+
+    def _open(self):
+        # check_same_thread is off only so close_all() can close every thread's
+        # connection at shutdown; each connection is still used by one thread.
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout, check_same_thread=False)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.cursor = conn.cursor()
+        return conn
+
+    def cursor(self):
+        self.connection()
+        return self._local.cursor
+
+    def ensure_schema(self, setup):
+        # Each schema setup runs once per process, not on every connect(); the
+        # lock is held throughout so a second thread waits for it to finish.
+        # Setups are tracked separately because several stores (the tweet
+        # queue, the response cache) can share one file.
+        key = getattr(setup, '__qualname__', setup)
+        with self._lock:
+            if key in self._schemas_ready:
+                return
+            setup()
+            self._schemas_ready.add(key)
+
+    def acquire(self):
+        with self._lock:
+            self._users += 1
+        return self
+
+    def release(self):
+        # Closes every thread's connection once no user of the file is left
+        with self._lock:
+            self._users = max(0, self._users - 1)
+            if not self._users:
+                self.close_all()
+
+    def close_thread(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            with self._lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            conn.close()
+            self._local.conn = None
+            self._local.cursor = None
+
+    def close_all(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error as e:
+                logging.error(f"Error closing database connection: {e}")
+        self._local = threading.local()
+
 
 class DBOperations:
-    def __init__(self, db_name='tweets.db'):
+    def __init__(self, db_name='tweets.db', archive_name=None):
         self.db_name = db_name
-        self.conn = None
-        self.cursor = None
+        self.archive_name = archive_name or f"{os.path.splitext(db_name)[0]}_archive.db"
+        self.manager = None
+        self.archive = None
         self.max_tweets = 10000  # Maximum number of tweets to keep
+        self.duplicate_similarity = 0.85  # SimHash similarity treated as a near-duplicate
+        self.duplicate_policy = 'reject'  # 'reject', 'flag' (store with duplicate_of set) or 'off'
+        self.last_rejection = None  # why the last add_tweet() stored nothing, for the review console
+
+    @property
+    def conn(self):
+        return self.manager.connection() if self.manager else None
+
+    @property
+    def cursor(self):
+        return self.manager.cursor() if self.manager else None
 
     def connect(self):
+        # Safe to call repeatedly: the connection is opened once per thread and reused
         try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
-            self.create_table()
-            self.create_index()
+            if self.manager is None:
+                self.manager = ConnectionManager.get(self.db_name).acquire()
+            self.manager.connection()
+            self.manager.ensure_schema(self.setup_schema)
+            if self.archive is None:
+                self.archive = TweetArchive(ConnectionManager.get(self.archive_name))
         except sqlite3.Error as e:
             logging.error(f"Error connecting to database: {e}")
 
     def close(self):
-        if self.conn:
-            self.conn.close()
-
-    def create_table(self):
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tweets
-        (id INTEGER PRIMARY KEY AUTOINCREMENT,
-         content TEXT NOT NULL,
-         status TEXT NOT NULL,
-         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-         posted_at TIMESTAMP)
-        ''')
-        self.conn.commit()
-
-    def create_index(self):
-        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_status ON tweets (status)')
-        self.conn.commit()
+        # Other DBOperations on the same file keep their connections; the
+        # shared manager closes them all only when its last user releases it
+        if self.manager:
+            self.manager.release()
+            self.manager = None
+        if self.archive:
+            self.archive.close()
+            self.archive = None
+
+    # Schema migrations, applied in order. PRAGMA user_version records the last
+    # one applied, so existing tweets.db files are upgraded in place. Each step
+    # is a list of SQL statements or callables taking a cursor.
+    MIGRATIONS = [
+        # 1: initial schema
+        [
+            '''CREATE TABLE IF NOT EXISTS tweets
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             content TEXT NOT NULL,
+             status TEXT NOT NULL,
+             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+             posted_at TIMESTAMP)''',
+            'CREATE INDEX IF NOT EXISTS idx_status ON tweets (status)',
+        ],
+        # 2: composite indexes so the queue and cleanup queries need no sort;
+        # idx_status is a prefix of both and no longer needed
+        [
+            'CREATE INDEX IF NOT EXISTS idx_status_created ON tweets (status, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_status_posted ON tweets (status, posted_at)',
+            'DROP INDEX IF EXISTS idx_status',
+            'ANALYZE tweets',
+        ],
+        # 3: per-status row counts kept by triggers, so capacity checks
+        # don't need a COUNT(*) scan on every insert
+        [
+            '''CREATE TABLE IF NOT EXISTS tweet_counts
+            (status TEXT PRIMARY KEY,
+             count INTEGER NOT NULL DEFAULT 0)''',
+            '''CREATE TRIGGER IF NOT EXISTS tweets_count_insert AFTER INSERT ON tweets BEGIN
+                INSERT INTO tweet_counts (status, count) VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET count = count + 1;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS tweets_count_delete AFTER DELETE ON tweets BEGIN
+                UPDATE tweet_counts SET count = count - 1 WHERE status = OLD.status;
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS tweets_count_update AFTER UPDATE OF status ON tweets
+            WHEN OLD.status IS NOT NEW.status BEGIN
+                UPDATE tweet_counts SET count = count - 1 WHERE status = OLD.status;
+                INSERT INTO tweet_counts (status, count) VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET count = count + 1;
+            END''',
+            'DELETE FROM tweet_counts',
+            'INSERT INTO tweet_counts (status, count) SELECT status, COUNT(*) FROM tweets GROUP BY status',
+        ],
+        # 4: FTS5 full-text index over tweet content, kept in sync by triggers
+        [
+            '''CREATE VIRTUAL TABLE IF NOT EXISTS tweets_fts USING fts5
+            (content, content='tweets', content_rowid='id', tokenize="unicode61 tokenchars '_'")''',
+            '''CREATE TRIGGER IF NOT EXISTS tweets_fts_insert AFTER INSERT ON tweets BEGIN
+                INSERT INTO tweets_fts (rowid, content) VALUES (NEW.id, NEW.content);
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS tweets_fts_delete AFTER DELETE ON tweets BEGIN
+                INSERT INTO tweets_fts (tweets_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+            END''',
+            '''CREATE TRIGGER IF NOT EXISTS tweets_fts_update AFTER UPDATE OF content ON tweets BEGIN
+                INSERT INTO tweets_fts (tweets_fts, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+                INSERT INTO tweets_fts (rowid, content) VALUES (NEW.id, NEW.content);
+            END''',
+            "INSERT INTO tweets_fts (tweets_fts) VALUES ('rebuild')",
+        ],
+        # 5: SimHash fingerprints and band index for near-duplicate detection.
+        # Fingerprints of posted tweets outlive the rows themselves, so
+        # history trimmed by cleanup still blocks repeats.
+        [
+            'ALTER TABLE tweets ADD COLUMN duplicate_of INTEGER',
+            '''CREATE TABLE IF NOT EXISTS tweet_fingerprints
+            (tweet_id INTEGER PRIMARY KEY,
+             simhash INTEGER NOT NULL)''',
+            '''CREATE TABLE IF NOT EXISTS fingerprint_bands
+            (band INTEGER NOT NULL,
+             value INTEGER NOT NULL,
+             tweet_id INTEGER NOT NULL,
+             PRIMARY KEY (band, value, tweet_id)) WITHOUT ROWID''',
+            '''CREATE TRIGGER IF NOT EXISTS tweets_fingerprint_delete AFTER DELETE ON tweets
+            WHEN OLD.status != 'posted' BEGIN
+                DELETE FROM fingerprint_bands WHERE tweet_id = OLD.id;
+                DELETE FROM tweet_fingerprints WHERE tweet_id = OLD.id;
+            END''',
+            lambda cursor: DBOperations.backfill_fingerprints(cursor),
+        ],
+        # 6: token usage, latency and outcome of every model call
+        [
+            '''CREATE TABLE IF NOT EXISTS model_calls
+            (id INTEGER PRIMARY KEY,
+             created_at REAL NOT NULL,
+             call_type TEXT NOT NULL,
+             model TEXT NOT NULL,
+             outcome TEXT NOT NULL,
+             prompt_tokens INTEGER NOT NULL DEFAULT 0,
+             completion_tokens INTEGER NOT NULL DEFAULT 0,
+             cached_tokens INTEGER NOT NULL DEFAULT 0,
+             images INTEGER NOT NULL DEFAULT 0,
+             latency_ms REAL NOT NULL)''',
+            'CREATE INDEX IF NOT EXISTS idx_model_calls_latency ON model_calls (call_type, outcome, latency_ms)',
+        ],
+        # 7: theme and hashtag usage history for the topic scheduler
+        [
+            '''CREATE TABLE IF NOT EXISTS topic_usage
+            (kind TEXT NOT NULL,
+             name TEXT NOT NULL,
+             uses INTEGER NOT NULL DEFAULT 0,
+             score REAL NOT NULL DEFAULT 0,
+             last_used REAL NOT NULL,
+             PRIMARY KEY (kind, name))''',
+            'CREATE INDEX IF NOT EXISTS idx_topic_usage_recent ON topic_usage (kind, last_used)',
+        ],
+        # 8: images generated ahead of posting. media_state is NULL until the
+        # bot decides, then 'none', 'ready' (media_hash names the file in the
+        # media store) or 'failed'
+        [
+            'ALTER TABLE tweets ADD COLUMN media_state TEXT',
+            'ALTER TABLE tweets ADD COLUMN media_hash TEXT',
+            'ALTER TABLE tweets ADD COLUMN media_type TEXT',
+            'CREATE INDEX IF NOT EXISTS idx_media_hash ON tweets (media_hash) WHERE media_hash IS NOT NULL',
+        ],
+        # 9: leased posting queue. A worker claims an authorized tweet by moving
+        # it to 'posting' with a lease; it ends 'posted', back in 'authorized'
+        # for another attempt, or 'failed' once attempts run out
+        [
+            'ALTER TABLE tweets ADD COLUMN lease_owner TEXT',
+            'ALTER TABLE tweets ADD COLUMN lease_expires REAL',
+            'ALTER TABLE tweets ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0',
+            'ALTER TABLE tweets ADD COLUMN last_error TEXT',
+            'ALTER TABLE tweets ADD COLUMN x_post_id TEXT',
+            'CREATE INDEX IF NOT EXISTS idx_status_lease ON tweets (status, lease_expires)',
+        ],
+        # 10: scheduler state, so a restart resumes each task's cadence
+        [
+            '''CREATE TABLE IF NOT EXISTS schedule_state
+            (task TEXT PRIMARY KEY,
+             next_run REAL,
+             last_run REAL,
+             last_duration REAL,
+             last_error TEXT)''',
+        ],
+    ]
+
+    def setup_schema(self):
+        self.migrate()
+
+    def schema_version(self):
+        return self.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def migrate(self):
+        target = len(self.MIGRATIONS)
+        if self.schema_version() >= target:
+            return
+        conn = self.conn
+        conn.commit()
+        # BEGIN IMMEDIATE takes the write lock up front, so a second process
+        # migrating at the same time waits and then sees the new version
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = self.schema_version()
+            cursor = conn.cursor()
+            for number in range(version + 1, target + 1):
+                for step in self.MIGRATIONS[number - 1]:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(f'PRAGMA user_version = {number}')
+                logging.info(f"Applied database migration {number}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def store_fingerprint(cursor, tweet_id, fingerprint):
+        cursor.execute("INSERT OR REPLACE INTO tweet_fingerprints (tweet_id, simhash) VALUES (?, ?)",
+                       (tweet_id, dedup.to_signed(fingerprint)))
+        cursor.execute("DELETE FROM fingerprint_bands WHERE tweet_id = ?", (tweet_id,))
+        cursor.executemany("INSERT INTO fingerprint_bands (band, value, tweet_id) VALUES (?, ?, ?)",
+                           [(band, value, tweet_id) for band, value in enumerate(dedup.bands(fingerprint))])
+
+    @staticmethod
+    def backfill_fingerprints(cursor):
+        rows = cursor.execute("SELECT id, content FROM tweets").fetchall()
+        for tweet_id, content in rows:
+            DBOperations.store_fingerprint(cursor, tweet_id, dedup.simhash(content))
+
+    def find_near_duplicate(self, content, fingerprint=None, exclude_id=None):
+        # Returns (tweet_id, similarity) of the closest stored tweet at or above
+        # duplicate_similarity, or None
+        if fingerprint is None:
+            fingerprint = dedup.simhash(content)
+        probes = dedup.probes(fingerprint, self.duplicate_similarity)
+        where = " OR ".join(f"(b.band = ? AND b.value IN ({', '.join('?' for _ in values)}))"
+                            for values in probes.values())
+        params = [v for band, values in probes.items() for v in (band, *values)]
+        self.cursor.execute(f"""
+            SELECT DISTINCT f.tweet_id, f.simhash
+            FROM fingerprint_bands b JOIN tweet_fingerprints f ON f.tweet_id = b.tweet_id
+            WHERE {where}
+        """, params)
+        best = None
+        for tweet_id, stored in self.cursor.fetchall():
+            if tweet_id == exclude_id:
+                continue
+            score = dedup.similarity(fingerprint, dedup.to_unsigned(stored))
+            if score >= self.duplicate_similarity and (best is None or score > best[1]):
+                best = (tweet_id, score)
+        return best
+
+    def _insert_tweet(self, content):
+        # Returns the new id, or None when the tweet is invalid or the
+        # duplicate policy rejects it; the reason is kept in last_rejection
+        self.last_rejection = tweet_validator.validate(content)
+        if self.last_rejection:
+            logging.warning(f"Rejected tweet: {self.last_rejection}")
+            return None
+        fingerprint = dedup.simhash(content)
+        duplicate = self.find_near_duplicate(content, fingerprint) if self.duplicate_policy != 'off' else None
+        if duplicate:
+            duplicate_id, score = duplicate
+            if self.duplicate_policy == 'reject':
+                self.last_rejection = f"near-duplicate of tweet {duplicate_id} (similarity {score:.2f})"
+                logging.warning(f"Rejected {self.last_rejection}")
+                return None
+            logging.warning(f"Flagged near-duplicate of tweet {duplicate_id} (similarity {score:.2f})")
+        self.cursor.execute("INSERT INTO tweets (content, status, duplicate_of) VALUES (?, ?, ?)",
+                            (content, 'pending', duplicate[0] if duplicate else None))
+        tweet_id = self.cursor.lastrowid
+        self.store_fingerprint(self.cursor, tweet_id, fingerprint)
+        return tweet_id
 
     def add_tweet(self, content):
         try:
-            self.cursor.execute("INSERT INTO tweets (content, status) VALUES (?, ?)",
-                                (content, 'pending'))
+            tweet_id = self._insert_tweet(content)
             self.conn.commit()
-            self.check_and_cleanup()
-            return self.cursor.lastrowid
+            if tweet_id:
+                self.check_and_cleanup()
+            return tweet_id
         except sqlite3.Error as e:
+            self.conn.rollback()
+            self.last_rejection = f"database error: {e}"
             logging.error(f"Error adding tweet to database: {e}")
             return None
 
     def bulk_add_tweets(self, tweets):
         try:
-            self.cursor.executemany("INSERT INTO tweets (content, status) VALUES (?, ?)",
-                                    [(tweet, 'pending') for tweet in tweets])
+            # One transaction; each insert is checked against earlier ones in the batch too
+            added = sum(1 for tweet in tweets if self._insert_tweet(tweet))
             self.conn.commit()
             self.check_and_cleanup()
-            return self.cursor.rowcount
+            return added
         except sqlite3.Error as e:
+            self.conn.rollback()
             logging.error(f"Error adding tweets in bulk to database: {e}")
             return 0
 
+    def update_tweet_content(self, tweet_id, content):
+        try:
+            self.cursor.execute("UPDATE tweets SET content = ? WHERE id = ?", (content, tweet_id))
+            if self.cursor.rowcount:
+                self.store_fingerprint(self.cursor, tweet_id, dedup.simhash(content))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logging.error(f"Error updating tweet: {e}")
+
+    PAGE_ORDERS = {
+        'id': ('id',),
+        'created_at': ('created_at', 'id'),
+    }
+
+    def get_tweet_page(self, status=None, order_by='id', descending=False, after=None, page_size=50):
+        # Keyset pagination: `after` is the sort key of the last row of the
+        # previous page, so each page is an index seek rather than an OFFSET scan.
+        # Returns (rows, next_key); next_key is None on the last page.
+        columns = self.PAGE_ORDERS[order_by]
+        direction = 'DESC' if descending else 'ASC'
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status)
+        if after is not None:
+            key = ', '.join(columns)
+            placeholders = ', '.join('?' for _ in columns)
+            conditions.append(f"({key}) {'<' if descending else '>'} ({placeholders})")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = ', '.join(f"{column} {direction}" for column in columns)
+        self.cursor.execute(f"SELECT id, content, status, created_at FROM tweets {where} ORDER BY {order} LIMIT ?",
+                            params + [page_size])
+        rows = self.cursor.fetchall()
+        if len(rows) < page_size:
+            return rows, None
+        last = rows[-1]
+        next_key = (last[0],) if order_by == 'id' else (last[3], last[0])
+        return rows, next_key
+
+    def iter_tweets(self, status=None, order_by='id', descending=False, page_size=200):
+        # Yields rows one page at a time; only a single page is held in memory
+        # and no cursor stays open between pages, so callers may update rows
+        # while iterating
+        after = None
+        while True:
+            rows, after = self.get_tweet_page(status, order_by, descending, after, page_size)
+            yield from rows
+            if after is None:
+                return
+
     def get_pending_tweets(self):
-        self.cursor.execute("SELECT id, content FROM tweets WHERE status = 'pending'")
-        return self.cursor.fetchall()
+        return ((tweet_id, content) for tweet_id, content, _, _ in self.iter_tweets(status='pending'))
+
+    @staticmethod
+    def build_match_query(query):
+        # Quote each term so user input like "zk-rollups" or "#privacy" can't
+        # break FTS5 query syntax; a trailing * keeps prefix matching
+        terms = []
+        for word in query.split():
+            prefix = word.endswith('*')
+            word = word.strip('#*')
+            if word:
+                term = '"' + word.replace('"', '""') + '"'
+                terms.append(term + '*' if prefix else term)
+        return ' '.join(terms)
+
+    def search(self, query, status=None, limit=20):
+        match = self.build_match_query(query)
+        if not match:
+            return []
+        sql = """
+            SELECT t.id, t.content, t.status, highlight(tweets_fts, 0, '[', ']'), bm25(tweets_fts) AS score
+            FROM tweets_fts JOIN tweets t ON t.id = tweets_fts.rowid
+            WHERE tweets_fts MATCH ?
+        """
+        params = [match]
+        if status is not None:
+            sql += " AND t.status = ?"
+            params.append(status)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        try:
+            self.cursor.execute(sql, params)
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Error searching tweets: {e}")
+            return []
 
     def authorize_tweet(self, tweet_id):
         try:
@@ -77,44 +516,261 @@ class DBOperations:
         except sqlite3.Error as e:
             logging.error(f"Error removing tweet: {e}")
 
-    def mark_as_posted(self, tweet_id):
+    def claim_next_tweet(self, worker, lease_seconds=900, max_attempts=3):
+        """Leases the next tweet to post to worker; safe across threads and processes.
+
+        Tweets whose lease expired (their worker died mid-post) are reclaimed
+        before new ones, unless they have used all max_attempts, in which case
+        they move to 'failed' instead. Returns (id, content, attempts,
+        reclaimed) or None. A reclaimed tweet may already be on X; the caller
+        reconciles that.
+        """
+        conn = self.conn
+        now = time.time()
         try:
-            self.cursor.execute("UPDATE tweets SET status = 'posted', posted_at = ? WHERE id = ?",
-                                (datetime.now(), tweet_id))
+            conn.commit()
+            # Take the write lock before reading so two workers can't claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            exhausted = conn.execute("""
+                UPDATE tweets SET status = 'failed', lease_owner = NULL, lease_expires = NULL,
+                                  last_error = CASE WHEN status = 'posting' THEN 'lease expired on the last attempt'
+                                                    ELSE COALESCE(last_error, 'no attempts left') END
+                WHERE (status = 'posting' AND lease_expires < ? OR status = 'authorized') AND attempts >= ?
+            """, (now, max_attempts)).rowcount
+            if exhausted:
+                logging.warning(f"Moved {exhausted} tweets with no attempts left to failed")
+            row = conn.execute("""
+                SELECT id, content, attempts FROM tweets
+                WHERE status = 'posting' AND lease_expires < ? AND attempts < ? ORDER BY lease_expires LIMIT 1
+            """, (now, max_attempts)).fetchone()
+            reclaimed = row is not None
+            if row is None:
+                row = conn.execute("""
+                    SELECT id, content, attempts FROM tweets
+                    WHERE status = 'authorized' AND attempts < ? ORDER BY created_at ASC LIMIT 1
+                """, (max_attempts,)).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            conn.execute("""
+                UPDATE tweets SET status = 'posting', lease_owner = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE id = ?
+            """, (worker, now + lease_seconds, row[0]))
+            conn.commit()
+            return row[0], row[1], row[2] + 1, reclaimed
+        except sqlite3.Error as e:
+            conn.rollback()
+            logging.error(f"Error claiming tweet: {e}")
+            return None
+
+    def complete_post(self, tweet_id, x_post_id=None):
+        # Idempotent: completing an already posted tweet changes nothing
+        try:
+            self.cursor.execute("""
+                UPDATE tweets SET status = 'posted', posted_at = ?, x_post_id = COALESCE(?, x_post_id),
+                                  lease_owner = NULL, lease_expires = NULL, last_error = NULL
+                WHERE id = ? AND status != 'posted'
+            """, (datetime.now(), x_post_id, tweet_id))
             self.conn.commit()
         except sqlite3.Error as e:
-            logging.error(f"Error marking tweet as posted: {e}")
+            logging.error(f"Error completing post: {e}")
 
-    def get_next_authorized_tweet(self):
-        self.cursor.execute("SELECT id, content FROM tweets WHERE status = 'authorized' ORDER BY created_at ASC LIMIT 1")
+    def release_tweet(self, tweet_id, worker, error, max_attempts=3, retry=True):
+        # Gives a failed claim back: to 'authorized' while attempts remain and
+        # the error is worth retrying, otherwise to 'failed'. Only the lease
+        # holder can release. Returns the new status, or None if not held.
+        try:
+            self.cursor.execute("""
+                UPDATE tweets SET status = CASE WHEN ? AND attempts < ? THEN 'authorized' ELSE 'failed' END,
+                                  lease_owner = NULL, lease_expires = NULL, last_error = ?
+                WHERE id = ? AND status = 'posting' AND lease_owner = ?
+            """, (retry, max_attempts, str(error)[:500], tweet_id, worker))
+            self.conn.commit()
+            if not self.cursor.rowcount:
+                return None
+            self.cursor.execute("SELECT status FROM tweets WHERE id = ?", (tweet_id,))
+            return self.cursor.fetchone()[0]
+        except sqlite3.Error as e:
+            logging.error(f"Error releasing tweet: {e}")
+            return None
+
+    def requeue_failed_tweets(self):
+        try:
+            self.cursor.execute("""
+                UPDATE tweets SET status = 'authorized', attempts = 0, last_error = NULL WHERE status = 'failed'
+            """)
+            self.conn.commit()
+            return self.cursor.rowcount
+        except sqlite3.Error as e:
+            logging.error(f"Error requeueing failed tweets: {e}")
+            return 0
+
+    def get_tweets_awaiting_media(self, limit=5):
+        self.cursor.execute("""
+            SELECT id, content FROM tweets
+            WHERE status = 'authorized' AND media_state IS NULL
+            ORDER BY created_at ASC LIMIT ?
+        """, (limit,))
+        return self.cursor.fetchall()
+
+    def set_tweet_media(self, tweet_id, state, media_hash=None, media_type=None):
+        try:
+            self.cursor.execute("UPDATE tweets SET media_state = ?, media_hash = ?, media_type = ? WHERE id = ?",
+                                (state, media_hash, media_type, tweet_id))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error setting tweet media: {e}")
+
+    def get_tweet_media(self, tweet_id):
+        # (media_hash, media_type), or None when the tweet has no image ready
+        self.cursor.execute("SELECT media_hash, media_type FROM tweets WHERE id = ? AND media_state = 'ready'",
+                            (tweet_id,))
         return self.cursor.fetchone()
 
+    def get_pinned_media(self):
+        # Media still needed by tweets that haven't been posted
+        self.cursor.execute("SELECT DISTINCT media_hash FROM tweets WHERE media_hash IS NOT NULL AND status != 'posted'")
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def archive_tweets(self, condition='1', params=(), limit=None, batch_size=500):
+        # Moves the oldest posted tweets matching condition into the compressed
+        # archive in batches. Each batch is written to the archive before it is
+        # deleted here, so a crash never loses rows (the archive skips repeats).
+        moved = 0
+        while limit is None or moved < limit:
+            size = batch_size if limit is None else min(batch_size, limit - moved)
+            self.cursor.execute(f"""
+                SELECT id, content, created_at, posted_at FROM tweets
+                WHERE status = 'posted' AND {condition}
+                ORDER BY posted_at ASC
+                LIMIT ?
+            """, list(params) + [size])
+            rows = self.cursor.fetchall()
+            if not rows:
+                break
+            self.archive.append(rows)
+            self.cursor.executemany("DELETE FROM tweets WHERE id = ?", [(row[0],) for row in rows])
+            self.conn.commit()
+            moved += len(rows)
+        return moved
+
     def cleanup_old_tweets(self, days=30):
         try:
-            self.cursor.execute("DELETE FROM tweets WHERE status = 'posted' AND posted_at < date('now', '-' || ? || ' days')", (days,))
-            self.conn.commit()
-            logging.info(f"Cleaned up tweets older than {days} days")
+            moved = self.archive_tweets("posted_at < date('now', '-' || ? || ' days')", [days])
+            if moved:
+                logging.info(f"Archived {moved} tweets posted more than {days} days ago")
+            return moved
         except sqlite3.Error as e:
+            self.conn.rollback()
             logging.error(f"Error cleaning up old tweets: {e}")
+            return 0
+
+    def get_status_counts(self):
+        self.cursor.execute("SELECT status, count FROM tweet_counts WHERE count > 0")
+        return dict(self.cursor.fetchall())
+
+    def count_tweets(self):
+        self.cursor.execute("SELECT COALESCE(SUM(count), 0) FROM tweet_counts")
+        return self.cursor.fetchone()[0]
+
+    @staticmethod
+    def window_bounds(since):
+        # created_at is written by SQLite in UTC, posted_at from datetime.now()
+        # in local time; returns since in each column's format
+        created_after = datetime.fromtimestamp(since, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        return created_after, str(datetime.fromtimestamp(since))
+
+    def count_stored_tweets(self, since=0):
+        # Every tweet ever inserted, including since-archived ones. A window
+        # counts only tweets still in the database or archive, not removed ones.
+        if not since:
+            self.cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'tweets'")
+            row = self.cursor.fetchone()
+            return row[0] if row else 0
+        created_after, posted_after = self.window_bounds(since)
+        self.cursor.execute("SELECT COUNT(*) FROM tweets WHERE created_at >= ?", (created_after,))
+        return self.cursor.fetchone()[0] + self.archive.count_since(posted_after, created_after)
+
+    def count_posted_tweets(self, since=0):
+        if not since:
+            return self.get_status_counts().get('posted', 0) + self.archive.stats()['tweets']
+        _, posted_after = self.window_bounds(since)
+        self.cursor.execute("SELECT COUNT(*) FROM tweets WHERE status = 'posted' AND posted_at >= ?", (posted_after,))
+        return self.cursor.fetchone()[0] + self.archive.count_since(posted_after)
+
+    def load_schedule(self):
+        # task -> next_run
+        self.cursor.execute("SELECT task, next_run FROM schedule_state")
+        return dict(self.cursor.fetchall())
+
+    def save_schedule(self, task, next_run=None, last_run=None, duration=None, error=None):
+        # Records a task's next slot, or the outcome of a run when last_run is given
+        try:
+            if last_run is None:
+                self.cursor.execute("""
+                    INSERT INTO schedule_state (task, next_run) VALUES (?, ?)
+                    ON CONFLICT (task) DO UPDATE SET next_run = excluded.next_run
+                """, (task, next_run))
+            else:
+                self.cursor.execute("""
+                    INSERT INTO schedule_state (task, last_run, last_duration, last_error) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (task) DO UPDATE SET last_run = excluded.last_run,
+                        last_duration = excluded.last_duration, last_error = excluded.last_error
+                """, (task, last_run, duration, error))
+            self.conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Error saving schedule state: {e}")
+
+    def record_model_calls(self, rows):
+        try:
+            self.cursor.executemany("""
+                INSERT INTO model_calls (created_at, call_type, model, outcome, prompt_tokens,
+                                         completion_tokens, cached_tokens, images, latency_ms)
+                VALUES (:created_at, :call_type, :model, :outcome, :prompt_tokens,
+                        :completion_tokens, :cached_tokens, :images, :latency_ms)
+            """, rows)
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logging.error(f"Error recording model call metrics: {e}")
+
+    def get_model_call_totals(self, since=0):
+        self.cursor.execute("""
+            SELECT call_type, model, outcome, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens),
+                   SUM(cached_tokens), SUM(images)
+            FROM model_calls WHERE created_at >= ?
+            GROUP BY call_type, model, outcome
+        """, (since,))
+        return self.cursor.fetchall()
+
+    def get_latency_percentile(self, call_type, percentile, since=0):
+        # Nearest-rank percentile read straight off the latency index
+        self.cursor.execute("""
+            SELECT COUNT(*) FROM model_calls WHERE call_type = ? AND outcome = 'ok' AND created_at >= ?
+        """, (call_type, since))
+        count = self.cursor.fetchone()[0]
+        if not count:
+            return None
+        offset = max(0, min(count - 1, int(round(percentile / 100 * count + 0.5)) - 1))
+        self.cursor.execute("""
+            SELECT latency_ms FROM model_calls WHERE call_type = ? AND outcome = 'ok' AND created_at >= ?
+            ORDER BY latency_ms LIMIT 1 OFFSET ?
+        """, (call_type, since, offset))
+        return self.cursor.fetchone()[0]
 
     def check_and_cleanup(self):
         try:
-            self.cursor.execute("SELECT COUNT(*) FROM tweets")
-            count = self.cursor.fetchone()[0]
+            counts = self.get_status_counts()
+            count = sum(counts.values())
             if count > self.max_tweets:
-                excess = count - self.max_tweets
-                self.cursor.execute("""
-                    DELETE FROM tweets 
-                    WHERE id IN (
-                        SELECT id FROM tweets 
-                        WHERE status = 'posted' 
-                        ORDER BY posted_at ASC 
-                        LIMIT ?
-                    )
-                """, (excess,))
-                self.conn.commit()
-                logging.info(f"Removed {excess} old tweets to maintain maximum capacity.")
+                # Only posted tweets are trimmed, so never try to remove more than exist
+                excess = min(count - self.max_tweets, counts.get('posted', 0))
+                if excess <= 0:
+                    return
+                moved = self.archive_tweets(limit=excess)
+                logging.info(f"Archived {moved} old tweets to maintain maximum capacity.")
         except sqlite3.Error as e:
+            self.conn.rollback()
             logging.error(f"Error during check and cleanup: {e}")
 
     def vacuum_database(self):
@@ -126,12 +782,73 @@ class DBOperations:
         except sqlite3.Error as e:
             logging.error(f"Error vacuuming database: {e}")
 
-    def perform_maintenance(self):
+    def auto_vacuum_mode(self):
+        return self.conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+
+    def freelist_count(self):
+        return self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def incremental_vacuum(self, time_budget=2.0, pages_per_step=64):
+        # Frees pages in small steps, each its own short write transaction, so
+        # other connections can write in between. Stops when the freelist is
+        # empty or the time budget is spent.
+        conn = self.conn
+        conn.commit()
+        start = time.monotonic()
+        before = self.freelist_count()
+        remaining = before
+        while remaining > 0 and time.monotonic() - start < time_budget:
+            conn.execute(f"PRAGMA incremental_vacuum({pages_per_step})").fetchall()
+            remaining = self.freelist_count()
+        return before - remaining, remaining
+
+    def optimize(self):
+        self.conn.execute("PRAGMA optimize").fetchall()
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+    def perform_maintenance(self, time_budget=2.0, convert=False):
+        # Older files predate auto_vacuum=INCREMENTAL and need one full VACUUM
+        # to switch over. That locks out every writer for its whole run, so it
+        # only happens when convert is set (from the review console, with the
+        # bot stopped); otherwise the report flags needs_conversion.
+        report = {'pages_freed': 0, 'pages_remaining': 0, 'converted': False, 'needs_conversion': False,
+                  'seconds': 0.0}
+        start = time.monotonic()
         try:
             self.cleanup_old_tweets()
             self.check_and_cleanup()
             self.conn.commit()  # Ensure all changes are committed before vacuum
-            self.vacuum_database()
-            logging.info("Database maintenance completed successfully.")
+            if self.auto_vacuum_mode() != 2 and convert:
+                self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self.vacuum_database()
+                report['converted'] = self.auto_vacuum_mode() == 2
+            elif self.auto_vacuum_mode() != 2:
+                report['needs_conversion'] = True
+                logging.warning("Database predates incremental auto-vacuum; convert it from the review console "
+                                "while the bot is stopped")
+            else:
+                report['pages_freed'], report['pages_remaining'] = self.incremental_vacuum(time_budget)
+            self.optimize()
+            report['seconds'] = time.monotonic() - start
+            logging.info(f"Database maintenance completed successfully: freed {report['pages_freed']} pages "
+                         f"({report['pages_remaining']} left) in {report['seconds']:.2f}s.")
         except sqlite3.Error as e:
             logging.error(f"Error during database maintenance: {e}")
+        return report
+
+    def start_background_maintenance(self, time_budget=2.0, on_complete=None):
+        # Runs on its own thread and connection; WAL mode lets the bot keep
+        # reading and writing while the short vacuum steps run. Never converts
+        # the file, as a full VACUUM would block the bot's writes.
+        def run():
+            try:
+                report = self.perform_maintenance(time_budget)
+                if on_complete:
+                    on_complete(report)
+            finally:
+                self.manager.close_thread()
+                self.archive.manager.close_thread()
+
+        thread = threading.Thread(target=run, name="db-maintenance", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,97 @@
+import math
+import re
+import hashlib
+from itertools import combinations
+
+# 64-bit SimHash fingerprints for near-duplicate detection. The fingerprint is
+# split into six bit ranges (bands) that are indexed in SQLite. Lookups probe
+# each band's value and every value within a few bits of it (multi-probe): if
+# two fingerprints differ in at most d bits, some band differs in at most
+# d // 6 of them, so probing radius r finds every match within 6 * (r + 1) - 1
+# bits. Candidate lookup stays a set of exact index seeks instead of a scan.
+FINGERPRINT_BITS = 64
+BAND_WIDTHS = [11, 11, 11, 11, 10, 10]
+SHINGLE_SIZE = 5
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Per-bit counts are accumulated in 16-bit fields of one big integer; SPREAD
+# maps a byte to its 8 bits spread out into 8 such fields.
+FIELD_BITS = 16
+SPREAD = [sum((byte >> i & 1) << (i * FIELD_BITS) for i in range(8)) for byte in range(256)]
+
+
+def features(text):
+    # Character shingles over normalised words are stable under small edits
+    normalised = ' '.join(TOKEN_PATTERN.findall(text.lower()))
+    if len(normalised) <= SHINGLE_SIZE:
+        return {normalised}
+    return {normalised[i:i + SHINGLE_SIZE] for i in range(len(normalised) - SHINGLE_SIZE + 1)}
+
+
+def feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text):
+    shingles = features(text)
+    totals = 0
+    for feature in shingles:
+        h = feature_hash(feature)
+        for i in range(8):
+            totals += SPREAD[h >> (8 * i) & 0xFF] << (8 * FIELD_BITS * i)
+    fingerprint = 0
+    mask = (1 << FIELD_BITS) - 1
+    for bit in range(FINGERPRINT_BITS):
+        if 2 * (totals >> (bit * FIELD_BITS) & mask) > len(shingles):
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+
+def similarity(a, b):
+    return 1 - hamming_distance(a, b) / FINGERPRINT_BITS
+
+
+def bands(fingerprint):
+    values = []
+    shift = 0
+    for width in BAND_WIDTHS:
+        values.append(fingerprint >> shift & ((1 << width) - 1))
+        shift += width
+    return values
+
+
+def max_distance(threshold):
+    # Largest Hamming distance whose similarity still reaches threshold
+    return math.floor((1 - threshold) * FINGERPRINT_BITS + 1e-9)
+
+
+def probe_radius(distance):
+    # Bits to flip per band so every fingerprint within distance shares a probe
+    return max(0, math.ceil((distance + 1) / len(BAND_WIDTHS)) - 1)
+
+
+def probes(fingerprint, threshold):
+    # band -> band values to look up for all candidates at or above threshold
+    radius = probe_radius(max_distance(threshold))
+    result = {}
+    for band, (value, width) in enumerate(zip(bands(fingerprint), BAND_WIDTHS)):
+        values = [value]
+        for flips in range(1, radius + 1):
+            for bits in combinations(range(width), flips):
+                values.append(value ^ sum(1 << bit for bit in bits))
+        result[band] = values
+    return result
+
+
+def to_signed(fingerprint):
+    # SQLite integers are signed 64-bit
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
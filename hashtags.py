@@ -0,0 +1,105 @@
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+from db_operations import DBOperations
+
+# Tags we always want available, in their preferred casing. A tag matches
+# when its lowercase form appears in a tweet as a word or as two adjacent
+# words run together ("open source" -> #OpenSource).
+CURATED_HASHTAGS = [
+    "AI", "MachineLearning", "AIethics", "Blockchain", "Crypto", "Cryptocurrency", "Bitcoin", "Monero",
+    "Ravencoin", "Web3", "DeFi", "Decentralization", "Decentralisation", "Cypherpunk", "Privacy",
+    "PrivacyMatters", "Cybersecurity", "Encryption", "ZeroKnowledge", "OpenSource", "Linux", "Python",
+    "Gaming", "GameDev", "VR", "AR", "IoT", "EdgeComputing", "Sustainability", "SustainableTech",
+    "ClimateTech", "FutureTech", "TechEthics", "DigitalRights", "SelfSovereignty", "Innovation",
+]
+
+STOP_WORDS = set("""
+a about after all also an and any are as at be because been but by can could do does for from has have
+how if in into is it its just like more most not now of on or our out over so some than that the their
+them then there these they this those to up us was we were what when where which while who why will
+with would you your yet every each may might must own via
+""".split())
+
+WORD_PATTERN = re.compile(r'(?<![#\w])[a-zA-Z][\w-]+')
+HASHTAG_PATTERN = re.compile(r'#(\w+)')
+
+
+def terms(text):
+    words = [w.lower() for w in WORD_PATTERN.findall(text)]
+    return {w for w in words if len(w) > 2 and w not in STOP_WORDS}
+
+
+def joined_terms(text):
+    # Single words and adjacent pairs run together, for curated tag matching
+    words = [w.lower().replace('-', '') for w in WORD_PATTERN.findall(text)]
+    return set(words) | {a + b for a, b in zip(words, words[1:])}
+
+
+class HashtagSuggester:
+    """Suggests hashtags for a tweet without a model call.
+
+    Learns which words co-occur with which hashtags across stored tweets
+    (TF-IDF weighted) and combines that with CURATED_HASHTAGS. The index is
+    built once from the database and archive, then caught up incrementally
+    from rows inserted since (by any process) on each suggest() call.
+    """
+
+    def __init__(self, db_name='tweets.db', min_score=1.0):
+        self.db = DBOperations(db_name)
+        self.min_score = min_score
+        self.documents = 0
+        self.term_docs = Counter()  # term -> tweets containing it
+        self.term_tags = defaultdict(Counter)  # term -> hashtag -> co-occurrences
+        self.tag_casing = {tag.lower(): tag for tag in CURATED_HASHTAGS}
+        self.last_id = None
+        self._lock = threading.Lock()
+
+    def add(self, text):
+        tags = {tag.lower() for tag in HASHTAG_PATTERN.findall(text)}
+        for tag in HASHTAG_PATTERN.findall(text):
+            self.tag_casing.setdefault(tag.lower(), tag)
+        words = terms(text)
+        self.documents += 1
+        for word in words:
+            self.term_docs[word] += 1
+            for tag in tags:
+                self.term_tags[word][tag] += 1
+
+    def refresh(self):
+        self.db.connect()
+        if self.last_id is None:
+            self.last_id = 0
+            for row in self.db.archive.iter_tweets():
+                self.add(row[1])
+        after = (self.last_id,)
+        while after:
+            rows, after = self.db.get_tweet_page(after=after, page_size=500)
+            for tweet_id, content, _, _ in rows:
+                self.add(content)
+                self.last_id = tweet_id
+
+    def suggest(self, text, count=2):
+        with self._lock:
+            self.refresh()
+            scores = Counter()
+            for word in terms(text):
+                docs = self.term_docs.get(word)
+                if not docs or word not in self.term_tags:
+                    continue
+                idf = math.log((1 + self.documents) / docs)
+                for tag, together in self.term_tags[word].items():
+                    scores[tag] += idf * together / docs
+            for candidate in joined_terms(text):
+                if candidate in self.tag_casing:
+                    scores[candidate] += self.min_score + 1
+            present = {tag.lower() for tag in HASHTAG_PATTERN.findall(text)}
+            ranked = [tag for tag, score in scores.most_common() if score >= self.min_score and tag not in present]
+            return [f"#{self.tag_casing.get(tag, tag)}" for tag in ranked[:count]]
+
+
+# Learns from the tweets in HASHTAGS_DB, like METRICS_DB and TOPICS_DB
+hashtag_suggester = HashtagSuggester(os.getenv('HASHTAGS_DB', 'tweets.db'))
@@ -0,0 +1,102 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+COPY_CHUNK = 64 * 1024
+
+
+class MediaStore:
+    """Content-addressed media files on disk with size-based LRU eviction.
+
+    Files are named by the SHA-256 of their bytes (media/ab/abcd...), so the
+    same image is stored once however many tweets use it. Reading a file
+    refreshes its mtime, and when the store grows past max_bytes the least
+    recently used files are removed, except those pinned by queued tweets.
+    """
+
+    def __init__(self, directory='media', max_bytes=500 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._pin_sources = []  # callables returning digests that must be kept
+        self._lock = threading.Lock()
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def add_pin_source(self, source):
+        self._pin_sources.append(source)
+
+    def put(self, file):
+        # Streams a file object into the store; returns its digest
+        os.makedirs(self.directory, exist_ok=True)
+        sha = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in iter(lambda: file.read(COPY_CHUNK), b''):
+                    sha.update(chunk)
+                    out.write(chunk)
+            digest = sha.hexdigest()
+            path = self.path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.evict()
+        return digest
+
+    def open(self, digest):
+        # Returns (file, size) or None if the file was never stored or has been evicted
+        path = self.path(digest)
+        try:
+            os.utime(path)
+            return open(path, 'rb'), os.path.getsize(path)
+        except OSError:
+            return None
+
+    def files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.part'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield name, path, stat.st_size, stat.st_mtime
+
+    def total_bytes(self):
+        return sum(size for _, _, size, _ in self.files())
+
+    def evict(self):
+        with self._lock:
+            entries = list(self.files())
+            total = sum(size for _, _, size, _ in entries)
+            if total <= self.max_bytes:
+                return 0
+            pinned = set()
+            for source in self._pin_sources:
+                pinned.update(source())
+            removed = 0
+            for digest, path, size, _ in sorted(entries, key=lambda entry: entry[3]):
+                if total <= self.max_bytes:
+                    break
+                if digest in pinned:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            if removed:
+                logging.info(f"Evicted {removed} media files, {total / 1024 / 1024:.1f} MB left in {self.directory}")
+            return removed
+
+
+media_store = MediaStore(os.getenv('MEDIA_DIR', 'media'), int(os.getenv('MEDIA_CACHE_MB', '500')) * 1024 * 1024)
@@ -0,0 +1,137 @@
+import atexit
+import logging
+import os
+import sys
+import threading
+import time
+
+from accounts import account_dbs
+from db_operations import DBOperations
+
+# USD per 1M tokens (input, cached input, output) and per generated image.
+# Update when pricing or the models in openai_api.py change.
+TOKEN_PRICES = {
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+}
+IMAGE_PRICES = {
+    'dall-e-3': 0.04,  # standard quality, 1024x1024
+}
+
+
+def call_cost(model, prompt_tokens, cached_tokens, completion_tokens, images=0):
+    input_price, cached_price, output_price = TOKEN_PRICES.get(model, (0.0, 0.0, 0.0))
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return ((uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+            + images * IMAGE_PRICES.get(model, 0.0))
+
+
+class MetricsRecorder:
+    """Buffers one row per model call and writes them to model_calls in batches.
+
+    A batch is flushed once batch_size rows are waiting or the oldest row is
+    flush_interval seconds old, and on interpreter exit.
+    """
+
+    def __init__(self, db_name='tweets.db', batch_size=20, flush_interval=30.0):
+        self.db = DBOperations(db_name)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._first_buffered = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, call_type, model, outcome, latency, prompt_tokens=0, completion_tokens=0,
+               cached_tokens=0, images=0):
+        row = {
+            'created_at': time.time(), 'call_type': call_type, 'model': model, 'outcome': outcome,
+            'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+            'cached_tokens': cached_tokens, 'images': images, 'latency_ms': latency * 1000,
+        }
+        with self._lock:
+            self._buffer.append(row)
+            if self._first_buffered is None:
+                self._first_buffered = time.monotonic()
+            due = (len(self._buffer) >= self.batch_size
+                   or time.monotonic() - self._first_buffered >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            self._first_buffered = None
+        if not rows:
+            return
+        try:
+            self.db.connect()
+            self.db.record_model_calls(rows)
+        except Exception as e:
+            logging.error(f"Error flushing model call metrics: {e}")
+
+    def summary(self, since=0, tweet_dbs=None):
+        # Calls from every account land in this one table, so cost per tweet
+        # should count the tweets of every account too: pass their dbs in
+        # tweet_dbs (default: just this recorder's db)
+        self.flush()
+        self.db.connect()
+        totals = self.db.get_model_call_totals(since)
+        total_cost = 0.0
+        calls = {}
+        for call_type, model, outcome, count, prompt, completion, cached, images in totals:
+            total_cost += call_cost(model, prompt or 0, cached or 0, completion or 0, images or 0)
+            entry = calls.setdefault(call_type, {'calls': 0, 'errors': 0, 'prompt_tokens': 0,
+                                                 'completion_tokens': 0, 'cached_tokens': 0})
+            entry['calls'] += count
+            if outcome == 'error':
+                entry['errors'] += count
+            entry['prompt_tokens'] += prompt or 0
+            entry['completion_tokens'] += completion or 0
+            entry['cached_tokens'] += cached or 0
+        for call_type, entry in calls.items():
+            entry['p50_ms'] = self.db.get_latency_percentile(call_type, 50, since)
+            entry['p95_ms'] = self.db.get_latency_percentile(call_type, 95, since)
+        # Every figure covers the same window, so cost per tweet compares like with like
+        stored = posted = 0
+        for db_name in tweet_dbs or [self.db.db_name]:
+            if not os.path.exists(db_name):
+                continue  # an account that has never run
+            db = self.db if os.path.abspath(db_name) == os.path.abspath(self.db.db_name) else DBOperations(db_name)
+            db.connect()
+            stored += db.count_stored_tweets(since)
+            posted += db.count_posted_tweets(since)
+            if db is not self.db:
+                db.close()
+        return {
+            'calls': calls,
+            'total_cost': total_cost,
+            'stored_tweets': stored,
+            'posted_tweets': posted,
+            'cost_per_stored': total_cost / stored if stored else None,
+            'cost_per_posted': total_cost / posted if posted else None,
+        }
+
+
+def format_summary(summary):
+    lines = [f"{'Call':<18}{'Calls':>7}{'Errors':>8}{'Prompt':>10}{'Cached':>10}{'Output':>9}{'p50 ms':>9}{'p95 ms':>9}"]
+    for call_type, e in sorted(summary['calls'].items()):
+        p50 = f"{e['p50_ms']:.0f}" if e['p50_ms'] is not None else '-'
+        p95 = f"{e['p95_ms']:.0f}" if e['p95_ms'] is not None else '-'
+        lines.append(f"{call_type:<18}{e['calls']:>7}{e['errors']:>8}{e['prompt_tokens']:>10}"
+                     f"{e['cached_tokens']:>10}{e['completion_tokens']:>9}{p50:>9}{p95:>9}")
+    per_stored = summary['cost_per_stored']
+    per_posted = summary['cost_per_posted']
+    lines.append(f"Total cost: ${summary['total_cost']:.4f}")
+    lines.append(f"Cost per stored tweet: {f'${per_stored:.5f}' if per_stored is not None else '-'} "
+                 f"({summary['stored_tweets']} stored)")
+    lines.append(f"Cost per posted tweet: {f'${per_posted:.5f}' if per_posted is not None else '-'} "
+                 f"({summary['posted_tweets']} posted)")
+    return '\n'.join(lines)
+
+
+metrics = MetricsRecorder(os.getenv('METRICS_DB', 'tweets.db'))
+
+if __name__ == "__main__":
+    # python metrics.py [days]  -- summary over the last N days (default: all time)
+    since = time.time() - float(sys.argv[1]) * 86400 if len(sys.argv) > 1 else 0
+    print(format_summary(metrics.summary(since, account_dbs())))
@@ -1,162 +1,252 @@
 import logging
 import re
-import json
-from openai import OpenAI
+from openai import OpenAI, APIConnectionError, APITimeoutError
 from dotenv import load_dotenv
 import os
-import random
+import threading
+import time
+from prompts import prompt_registry
+from response_cache import ResponseCache
+from resilience import env_rate, get_endpoint
+from metrics import metrics
+from hashtags import hashtag_suggester
+from topics import TopicTracker
+import tweet_validator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Initialize OpenAI client; retries are handled by the shared resilience layer
+client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'), max_retries=0)
+
+# Shared rate limits, retries and circuit breakers for the OpenAI endpoints
+OPENAI_TRANSIENT_ERRORS = (APIConnectionError, APITimeoutError)
+chat_endpoint = get_endpoint("openai.chat", rate=env_rate("openai.chat", 1.0), capacity=10,
+                             transient_errors=OPENAI_TRANSIENT_ERRORS)
+images_endpoint = get_endpoint("openai.images", rate=env_rate("openai.images", 0.1), capacity=2,
+                               transient_errors=OPENAI_TRANSIENT_ERRORS)
+
+# Theme and hashtag history shared with review_tweets.py through the database
+topic_tracker = TopicTracker(os.getenv('TOPICS_DB', 'tweets.db'))
+
+# Cache for repeatable calls (hashtags, images); set OPENAI_CACHE_DB to keep
+# entries in SQLite across restarts
+response_cache = ResponseCache(db_name=os.getenv('OPENAI_CACHE_DB'))
 
 class OpenAIClient:
-    recent_topics_file = "recent_topics.json"
-    recent_topics = []
+    recent_topics_file = "recent_topics.json"  # legacy list, imported into the database once
     max_recent_topics = 10
-    MAX_TWEET_LENGTH = 2000
+    MAX_TWEET_LENGTH = tweet_validator.MAX_WEIGHTED_LENGTH  # in X weighted characters
+    persona = None  # None uses PROMPTS/active_persona, then $PERSONA, then 'cerberus'
+    # Maximum number of OpenAI requests in flight during bulk generation
+    bulk_concurrency = int(os.getenv('OPENAI_BULK_CONCURRENCY', '8'))
+    # One pool for every bulk run, so its threads (and the per-thread SQLite
+    # connections the trackers open on them) are reused instead of piling up
+    _bulk_executor = None
+    _bulk_executor_lock = threading.Lock()
+    # Running totals of prompt and provider-cached tokens across calls
+    usage_stats = {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0}
+    _usage_lock = threading.Lock()
 
     @staticmethod
     def load_recent_topics():
-        try:
-            with open(OpenAIClient.recent_topics_file, 'r') as f:
-                OpenAIClient.recent_topics = json.load(f)
-        except FileNotFoundError:
-            OpenAIClient.recent_topics = []
+        topic_tracker.import_legacy_file(OpenAIClient.recent_topics_file)
+
+    @staticmethod
+    def get_recent_topics(topics=None):
+        return (topics or topic_tracker).recent('hashtag', OpenAIClient.max_recent_topics)
 
     @staticmethod
-    def save_recent_topics():
-        with open(OpenAIClient.recent_topics_file, 'w') as f:
-            json.dump(OpenAIClient.recent_topics, f)
+    def update_recent_topics(tweet, theme=None, topics=None):
+        # Single-row upserts in the database; safe from several threads and processes
+        (topics or topic_tracker).record_tweet(tweet, theme)
 
     @staticmethod
-    def update_recent_topics(topic):
-        if topic not in OpenAIClient.recent_topics:
-            OpenAIClient.recent_topics.append(topic)
-            if len(OpenAIClient.recent_topics) > OpenAIClient.max_recent_topics:
-                OpenAIClient.recent_topics.pop(0)
-        OpenAIClient.save_recent_topics()
+    def record_usage(call, model, response, latency):
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            # Image responses carry no token usage
+            metrics.record(call, model, 'ok', latency, images=len(getattr(response, 'data', None) or []))
+            return
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', 0) or 0) if details else 0
+        with OpenAIClient._usage_lock:
+            stats = OpenAIClient.usage_stats
+            stats['calls'] += 1
+            stats['prompt_tokens'] += usage.prompt_tokens
+            stats['cached_tokens'] += cached_tokens
+        metrics.record(call, model, 'ok', latency, usage.prompt_tokens, usage.completion_tokens, cached_tokens)
+        logging.info(f"{call}: {usage.prompt_tokens} prompt tokens ({cached_tokens} cached), "
+                     f"{usage.completion_tokens} completion tokens in {latency:.2f}s")
 
     @staticmethod
-    def extract_main_topic(tweet):
-        hashtags = re.findall(r'#(\w+)', tweet)
-        return hashtags[0] if hashtags else "Unknown"
+    def generate_tweet(persona=None, topics=None):
+        tweets, _ = OpenAIClient.generate_tweets(persona=persona, topics=topics)
+        return tweets[0] if tweets else None
 
     @staticmethod
-    def generate_tweet():
+    def generate_tweets(candidates=1, persona=None, topics=None):
+        # Asks for `candidates` completions of the same prompt in one request
+        # (n=candidates), so the system prompt is only paid for once.
+        # persona and topics (a TopicTracker) default to the class persona and
+        # the shared tracker; the multi-account runner passes its own.
+        # Returns (tweets, prompt_tokens).
+        start = None
+        topics = topics or topic_tracker
         try:
-            recent_topics_str = ", ".join(OpenAIClient.recent_topics)
+            recent_topics_str = ", ".join(OpenAIClient.get_recent_topics(topics))
             
-            # Define a list of content themes
-            content_themes = [
-                "Decentralization and its potential to disrupt traditional power structures",
-                "Blockchain and cryptocurrency innovations for a more equitable future",
-                "Cybersecurity and privacy: Safeguarding individual rights in a digital age",
-                "Gaming technology: Pioneering new frontiers in immersive experiences",
-                "Open-source software as a catalyst for technological and societal change",
-                "AI and machine learning: Balancing transformative potential with ethical risks",
-                "Cypherpunk philosophy and its ongoing relevance in shaping technology",
-                "Technology's impact on the nature of reality and human perception",
-                "Leveraging tech innovations to solve global sustainability challenges",
-                "Empowering individuals through decentralized tools and platforms",
-                "Emerging tech (IoT, edge computing) and its influence on daily life",
-                "Fostering community and collaboration in gaming and tech spaces",
-                "Reflecting on technology's societal impact through a cypherpunk lens",
-                "Imagining alternative futures shaped by decentralized technologies"
-            ]
+            # Persona prompt and content themes come from PROMPTS/, cached
+            # until the files change on disk
+            template = prompt_registry.get(persona or OpenAIClient.persona)
             
-            # Randomly select a content theme
-            selected_theme = random.choice(content_themes)
+            # Pick a content theme, favouring ones not used often or recently
+            selected_theme = topics.choose_theme(template.themes) or "a current tech topic of your choice"
             
-            systemprompt = f"""You are Cerberus, a cypherpunk technologist with deep expertise in decentralization, blockchain, gaming, and emerging tech. With a background in networking, hardware, and software engineering, you bring a pragmatic yet visionary perspective to your content.
-
-Post Guidelines:
-1. Focus on the following tech topic: {selected_theme}
-2. Aim for approximately 250-300 characters, including spaces and punctuation.
-3. Offer unique insights that challenge conventional thinking and spark discussion
-4. Explain complex ideas clearly, balancing depth with accessibility 
-5. Make bold, reasoned predictions about future tech developments
-6. Write with confidence, reflection, and a cypherpunk point of view
-7. Include 1-2 specific, relevant hashtags
-8. Aim for concise content, optimized for engagement
-9. Use Australian English spelling and grammar. Proofread for typos and clarity.
-
-Writing Style:
-- Vary your opening techniques to hook readers; avoid repetitive phrases like "Exploring," "Unveiling," "Unleashing," "Diving into," or starting with an emoji.
-- Hook readers with your first line using questions, surprising facts, metaphors, bold statements, brief anecdotes, etc.
-- Incorporate vivid language, analogies and metaphors to make complex ideas relatable and memorable.
-- Optimize flow and readability. Ensure each sentence builds on the previous one logically. 
-- Conclude with a strong final line that provokes further thought or discussion.
-- Mix up your sentence structures and lengths to create a dynamic, engaging rhythm.
-
-Engagement Strategies:
-- Connect tech to relatable scenarios and cultural touchstones
-- Highlight surprising parallels and contrasts across domains
-- Challenge conventional wisdom or tech hype with reasoned counterpoints 
-- Explore tech's impact on individuals, communities, and society
-- Extrapolate current tech trajectories to paint vivid pictures of future possibilities, both positive and negative
-- Emphasize the human element in tech by exploring user behaviors, developer motivations, societal reactions, etc.
-- Occasionally pose questions or polls to invite interaction
-
-Recent topics to avoid: {recent_topics_str}. Please choose a different topic that hasn't been covered recently. Aim for a balanced mix of your core themes over time."""
-
-            response = client.chat.completions.create(
+            # The system message is the persona's static text only, identical on
+            # every call so the provider can serve it from its prompt cache;
+            # everything that varies goes in the short user message after it
+            systemprompt = template.static_text
+            dynamic = template.render_dynamic(selected_theme=selected_theme, recent_topics_str=recent_topics_str)
+            user_message = f"Generate a post about {selected_theme}, avoiding recent topics if possible."
+            if dynamic:
+                user_message += f"\n\n{dynamic}"
+
+            start = time.perf_counter()
+            response = chat_endpoint.call(lambda: client.chat.completions.create(
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": systemprompt},
-                    {"role": "user", "content": f"Generate a post about {selected_theme}, avoiding recent topics if possible."}
+                    {"role": "user", "content": user_message}
                 ],
                 max_tokens=100,
-                n=1,
+                n=candidates,
                 temperature=0.8,
-            )
-            
-            tweet_content = response.choices[0].message.content.strip()
+            ))
+            OpenAIClient.record_usage("generate_tweet", "gpt-4o-mini", response, time.perf_counter() - start)
             
-            main_topic = OpenAIClient.extract_main_topic(tweet_content)
-            OpenAIClient.update_recent_topics(main_topic)
-            
-            return tweet_content
+            tweets = []
+            for choice in response.choices:
+                tweet_content = choice.message.content.strip()
+                if not tweet_content:
+                    continue
+                tweets.append(tweet_content)
+
+            if tweets:
+                OpenAIClient.update_recent_topics(' '.join(tweets), selected_theme, topics)
+
+            usage = getattr(response, 'usage', None)
+            return tweets, (usage.prompt_tokens if usage else 0)
 
         except Exception as e:
+            if start is not None:
+                metrics.record("generate_tweet", "gpt-4o-mini", 'error', time.perf_counter() - start)
             logging.error(f"Error in OpenAI API call: {e}", exc_info=True)
-            return None
+            return [], 0
+
+    @staticmethod
+    def generate_tweet_with_hashtags(persona=None, topics=None):
+        return OpenAIClient.finalize_tweet(OpenAIClient.generate_tweet(persona, topics))
 
     @staticmethod
-    def generate_tweet_with_hashtags():
-        tweet = OpenAIClient.generate_tweet()
+    def generate_candidates_with_hashtags(candidates, persona=None, topics=None):
+        # Returns (tweets, prompt_tokens) for one multi-candidate request
+        tweets, prompt_tokens = OpenAIClient.generate_tweets(candidates, persona, topics)
+        return [t for t in map(OpenAIClient.finalize_tweet, tweets) if t], prompt_tokens
+
+    @staticmethod
+    def finalize_tweet(tweet):
         if tweet:
             # Check if the tweet already has hashtags
             if not re.search(r'#\w+', tweet):
-                # If no hashtags, generate and append them
-                hashtags = OpenAIClient.generate_hashtags(tweet)
+                # If no hashtags, suggest them locally and only ask the model
+                # when the local index has nothing confident to offer
+                hashtags = hashtag_suggester.suggest(tweet) or OpenAIClient.generate_hashtags(tweet)
                 tweet = tweet.rstrip('.') + ' ' + ' '.join(hashtags)
 
-            # Ensure the tweet is not longer than MAX_TWEET_LENGTH characters
-            if len(tweet) > OpenAIClient.MAX_TWEET_LENGTH:
-                tweet = tweet[:OpenAIClient.MAX_TWEET_LENGTH - 3] + "..."
+            # Ensure the tweet fits MAX_TWEET_LENGTH as X counts it, cutting at a
+            # sentence or word boundary and keeping the hashtags
+            tweet = tweet_validator.fit(tweet, OpenAIClient.MAX_TWEET_LENGTH)
             
             return tweet
         return None
     
+    @staticmethod
+    def bulk_executor():
+        with OpenAIClient._bulk_executor_lock:
+            if OpenAIClient._bulk_executor is None:
+                OpenAIClient._bulk_executor = ThreadPoolExecutor(max_workers=OpenAIClient.bulk_concurrency,
+                                                                 thread_name_prefix="openai-bulk")
+            return OpenAIClient._bulk_executor
+
+    @staticmethod
+    def generate_tweets_concurrently(count, max_workers=None, candidates=1, usage=None):
+        # Yields (index, tweet) as each request finishes, in completion order.
+        # tweet is None when that generation failed. With candidates > 1 each
+        # request returns that many tweets. If a usage dict is passed, prompt
+        # tokens and request counts are added to it.
+        requests_needed = -(-count // candidates)
+        max_workers = max(1, min(requests_needed, max_workers or OpenAIClient.bulk_concurrency))
+        executor = OpenAIClient.bulk_executor()
+        waiting = iter(range(requests_needed))
+        pending = set()
+        index = 0
+        try:
+            while True:
+                # Keep at most max_workers requests in flight on the shared pool
+                for i in waiting:
+                    pending.add(executor.submit(OpenAIClient.generate_candidates_with_hashtags,
+                                                min(candidates, count - i * candidates)))
+                    if len(pending) >= max_workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        tweets, prompt_tokens = future.result()
+                    except Exception as e:
+                        logging.error(f"Error in concurrent tweet generation: {e}", exc_info=True)
+                        tweets, prompt_tokens = [], 0
+                    if usage is not None:
+                        usage['prompt_tokens'] = usage.get('prompt_tokens', 0) + prompt_tokens
+                        usage['requests'] = usage.get('requests', 0) + 1
+                    for tweet in tweets or [None]:
+                        yield index, tweet
+                        index += 1
+        finally:
+            # A caller that stops early doesn't leave queued requests behind
+            for future in pending:
+                future.cancel()
+
     @staticmethod
     def generate_hashtags(tweet_content, num_hashtags=3):
+        messages = [
+            {"role": "system", "content": "Generate relevant hashtags for the given tweet content."},
+            {"role": "user", "content": f"Generate {num_hashtags} relevant hashtags for this tweet:\n\n{tweet_content}"}
+        ]
+        cache_key = response_cache.make_key("gpt-4o-mini", messages, max_tokens=30, n=1, temperature=0.7)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            metrics.record("generate_hashtags", "gpt-4o-mini", 'cache_hit', 0.0)
+            return cached
+        start = time.perf_counter()
         try:
-            response = client.chat.completions.create(
+            response = chat_endpoint.call(lambda: client.chat.completions.create(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Generate relevant hashtags for the given tweet content."},
-                    {"role": "user", "content": f"Generate {num_hashtags} relevant hashtags for this tweet:\n\n{tweet_content}"}
-                ],
+                messages=messages,
                 max_tokens=30,
                 n=1,
                 temperature=0.7,
-            )
+            ))
+            OpenAIClient.record_usage("generate_hashtags", "gpt-4o-mini", response, time.perf_counter() - start)
             hashtags = response.choices[0].message.content.strip().split()
-            return [tag if tag.startswith('#') else f'#{tag}' for tag in hashtags]
+            hashtags = [tag if tag.startswith('#') else f'#{tag}' for tag in hashtags]
+            response_cache.set('hashtags', cache_key, hashtags)
+            return hashtags
         except Exception as e:
+            metrics.record("generate_hashtags", "gpt-4o-mini", 'error', time.perf_counter() - start)
             logging.error(f"Error generating hashtags: {e}", exc_info=True)
             return ['#tech', '#innovation', '#future']  # Fallback hashtags
     
@@ -165,17 +255,27 @@ Recent topics to avoid: {recent_topics_str}. Please choose a different topic tha
         if not prompt.strip():
             logging.warning("Empty prompt provided for image generation")
             return None
+        image_prompt = f"Create an image representing the following tech concept: {prompt}"
+        cache_key = response_cache.make_key("dall-e-3", image_prompt, size="1024x1024", quality="standard", n=1)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            metrics.record("generate_image", "dall-e-3", 'cache_hit', 0.0)
+            return cached
+        start = time.perf_counter()
         try:
-            response = client.images.generate(
+            response = images_endpoint.call(lambda: client.images.generate(
                 model="dall-e-3",
-                prompt=f"Create an image representing the following tech concept: {prompt}",
+                prompt=image_prompt,
                 size="1024x1024",
                 quality="standard",
                 n=1,
-            )
+            ))
+            OpenAIClient.record_usage("generate_image", "dall-e-3", response, time.perf_counter() - start)
             image_url = response.data[0].url
+            response_cache.set('image', cache_key, image_url)
             return image_url
         except Exception as e:
+            metrics.record("generate_image", "dall-e-3", 'error', time.perf_counter() - start)
             logging.error(f"Error in OpenAI image generation: {e}", exc_info=True)
             return None
 
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+import random
+
+from config import AnsiColor
+
+
+class TweetProducer:
+    """Keeps a buffer of pending tweets in the database, off the posting path.
+
+    When the pending count drops below low_watermark, refill() generates
+    until it reaches high_watermark, running each generation on a worker
+    thread so the event loop (and posting) never waits on OpenAI. The bot's
+    scheduler calls it every poll_interval seconds, and after a failed
+    generation waits backoff_delay(), which grows exponentially up to
+    max_backoff seconds.
+    """
+
+    def __init__(self, db, produce, low_watermark=5, high_watermark=20, poll_interval=300, max_backoff=3600,
+                 log=None):
+        # produce() generates and stores tweets, returning how many were stored.
+        # log is a logger (or adapter) used for progress messages
+        self.db = db
+        self.produce = produce
+        self.low_watermark = low_watermark
+        self.high_watermark = max(high_watermark, low_watermark)
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.log = log or logging.getLogger()
+
+    def pending_count(self):
+        return self.db.get_status_counts().get('pending', 0)
+
+    def backoff_delay(self):
+        delay = min(self.max_backoff, self.poll_interval * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def refill(self):
+        pending = self.pending_count()
+        if pending >= self.low_watermark:
+            return True
+        self.log.info(f"{AnsiColor.OKBLUE}Pending buffer at {pending}, refilling to {self.high_watermark}{AnsiColor.ENDC}")
+        while pending < self.high_watermark:
+            stored = await asyncio.to_thread(self.produce)
+            if not stored:
+                self.failures += 1
+                return False
+            self.failures = 0
+            pending = self.pending_count()
+        return True
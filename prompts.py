@@ -0,0 +1,150 @@
+import logging
+import os
+import re
+import string
+import threading
+import time
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PROMPTS')
+
+# Section headings in persona files whose bullet lists are used as content
+# themes when the persona has no separate <name>.themes.txt file
+THEME_HEADINGS = re.compile(r'^(Content Themes|Topics to explore include):\s*$', re.IGNORECASE)
+
+
+class PromptTemplate:
+    """A persona prompt parsed once into literal segments and placeholders."""
+
+    def __init__(self, name, text, themes):
+        self.name = name
+        self.text = text
+        self.themes = themes
+        self.segments = self.compile(text)
+        self.fields = {field for _, field in self.segments if field}
+        # Lines with placeholders are split off so the rest of the prompt is a
+        # byte-identical prefix on every call (provider-side prompt caching
+        # only matches on an unchanged prefix)
+        lines = text.splitlines()
+        self.static_text = '\n'.join(line for line in lines if not self.has_placeholder(line)).strip()
+        self.dynamic_segments = self.compile('\n'.join(line.strip() for line in lines if self.has_placeholder(line)))
+
+    @staticmethod
+    def compile(text):
+        return [(literal, field) for literal, field, _, _ in string.Formatter().parse(text)] or [('', None)]
+
+    @staticmethod
+    def has_placeholder(line):
+        return any(field is not None for _, field in PromptTemplate.compile(line))
+
+    @staticmethod
+    def _render(segments, values):
+        parts = []
+        for literal, field in segments:
+            parts.append(literal)
+            if field:
+                parts.append(str(values[field]))
+        return ''.join(parts)
+
+    def render(self, **values):
+        return self._render(self.segments, values)
+
+    def render_dynamic(self, **values):
+        # Only the placeholder lines; send these after static_text
+        return self._render(self.dynamic_segments, values)
+
+
+class PromptRegistry:
+    """Loads persona prompts and theme lists from PROMPTS/ and caches them.
+
+    <name>.txt holds the prompt with str.format-style placeholders and
+    <name>.themes.txt (optional) one theme per line. Files are only re-read
+    when their mtime changes, and mtimes are checked at most every
+    check_interval seconds. PROMPTS/active_persona, if present, names the
+    persona to use, so personas can be switched without a restart.
+    """
+
+    ACTIVE_FILE = 'active_persona'
+
+    def __init__(self, directory=PROMPTS_DIR, default_persona='cerberus', check_interval=2.0):
+        self.directory = directory
+        self.default_persona = default_persona
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._cache = {}  # name -> (mtimes, PromptTemplate, checked_at)
+        self._active = (None, None)  # (mtime, name)
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        # Older persona files were pasted from Python source with the quotes
+        if text.startswith('"""') and text.rstrip().endswith('"""'):
+            text = text[3:text.rstrip().rindex('"""')]
+        return text
+
+    @staticmethod
+    def extract_themes(text):
+        themes = []
+        in_section = False
+        for line in text.splitlines():
+            stripped = line.strip()
+            if THEME_HEADINGS.match(stripped):
+                in_section = True
+            elif in_section and stripped.startswith('- '):
+                themes.append(stripped[2:].strip())
+            elif in_section and themes:
+                break
+        return themes
+
+    def _load(self, name):
+        text = self._read(self.path(f"{name}.txt"))
+        themes_path = self.path(f"{name}.themes.txt")
+        if os.path.exists(themes_path):
+            with open(themes_path, 'r', encoding='utf-8') as f:
+                themes = [line.strip() for line in f if line.strip()]
+        else:
+            themes = self.extract_themes(text)
+        logging.info(f"Loaded prompt template '{name}' with {len(themes)} themes")
+        return PromptTemplate(name, text, themes)
+
+    def get(self, name=None):
+        name = name or self.active_persona()
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached and now - cached[2] < self.check_interval:
+                return cached[1]
+            mtimes = (self._mtime(self.path(f"{name}.txt")), self._mtime(self.path(f"{name}.themes.txt")))
+            if cached and cached[0] == mtimes:
+                self._cache[name] = (mtimes, cached[1], now)
+                return cached[1]
+            template = self._load(name)
+            self._cache[name] = (mtimes, template, now)
+            return template
+
+    def active_persona(self):
+        path = self.path(self.ACTIVE_FILE)
+        mtime = self._mtime(path)
+        if mtime is None:
+            return os.getenv('PERSONA', self.default_persona)
+        if self._active[0] != mtime:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._active = (mtime, f.read().strip() or self.default_persona)
+        return self._active[1]
+
+    def personas(self):
+        return sorted(f[:-4] for f in os.listdir(self.directory)
+                      if f.endswith('.txt') and not f.endswith('.themes.txt'))
+
+
+prompt_registry = PromptRegistry()
@@ -0,0 +1,217 @@
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+
+# Status codes worth retrying: rate limited or upstream trouble
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_at):
+        super().__init__(f"Circuit for {name} is open for another {max(0, retry_at - time.time()):.0f}s")
+        self.name = name
+        self.retry_at = retry_at
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and stays open for
+    `reset_timeout` seconds; then one trial call decides whether it closes."""
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60, max_pause=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_pause = max_pause  # callers wait out shorter outages instead of failing
+        self.failures = 0
+        self.open_until = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        while True:
+            with self._lock:
+                now = time.time()
+                if now >= self.open_until:
+                    if self.failures < self.failure_threshold and not self._trial_running:
+                        return
+                    if not self._trial_running:
+                        # Half-open: let a single trial call through
+                        self._trial_running = True
+                        return
+                    wait = 1.0
+                else:
+                    wait = self.open_until - now
+            if wait > self.max_pause:
+                raise CircuitOpenError(self.name, time.time() + wait)
+            time.sleep(wait)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.failure_threshold:
+                self.open_until = time.time() + self.reset_timeout
+                logging.warning(f"Circuit for {self.name} opened for {self.reset_timeout}s after {self.failures} failures")
+
+    def release_trial(self):
+        # The trial call was rate limited: it says nothing about the outage,
+        # so the next caller gets to try again
+        with self._lock:
+            self._trial_running = False
+
+    def open_for(self, seconds):
+        # Used when the upstream names a reset time too far away to wait for
+        with self._lock:
+            self.open_until = max(self.open_until, time.time() + seconds)
+            self._trial_running = False
+            logging.warning(f"Circuit for {self.name} paused for {seconds:.0f}s until the rate limit resets")
+
+
+def parse_retry_after(headers):
+    # Returns seconds to wait from Retry-After or x-rate-limit-reset, or None
+    if not headers:
+        return None
+    retry_after = headers.get('retry-after') or headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            parsed = email.utils.parsedate_to_datetime(retry_after)
+            if parsed:
+                return max(0.0, parsed.timestamp() - time.time())
+    reset = headers.get('x-rate-limit-reset') or headers.get('X-Rate-Limit-Reset')
+    if reset:
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            return None
+    return None
+
+
+class ResilientEndpoint:
+    """Rate limiting, retries with backoff and a circuit breaker for one upstream endpoint.
+
+    call(fn) runs fn until it returns a non-retryable result or attempts run
+    out. fn may return a response object (its status_code is checked) or
+    raise; exceptions with a retryable status_code or of a type listed in
+    transient_errors are retried, anything else is raised immediately.
+
+    For a non-idempotent call (idempotent=False) a 5xx or timeout may mean the
+    request was carried out, so only a 429 or an exception listed in
+    unsent_errors (the request never reached the server) is retried.
+    """
+
+    def __init__(self, name, rate=1.0, capacity=5, max_attempts=4, base_delay=1.0, max_delay=60.0,
+                 max_wait=300.0, failure_threshold=5, reset_timeout=60, transient_errors=(), idempotent=True,
+                 unsent_errors=()):
+        self.name = name
+        self.bucket = TokenBucket(rate, capacity)
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait  # longest server-requested wait honoured inline
+        self.transient_errors = tuple(transient_errors)
+        self.idempotent = idempotent
+        self.unsent_errors = tuple(unsent_errors)
+
+    def backoff(self, attempt):
+        # Exponential backoff with full jitter
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    @staticmethod
+    def _headers(obj):
+        response = getattr(obj, 'response', obj)
+        return getattr(response, 'headers', None)
+
+    def call(self, fn):
+        for attempt in range(1, self.max_attempts + 1):
+            self.breaker.before_call()
+            self.bucket.acquire()
+            try:
+                result = fn()
+            except Exception as e:
+                status = getattr(e, 'status_code', None)
+                if status not in RETRYABLE_STATUS and not isinstance(e, self.transient_errors):
+                    self.breaker.record_success()  # the upstream answered
+                    raise
+                headers, outcome = self._headers(e), e
+            else:
+                status = getattr(result, 'status_code', None)
+                if status not in RETRYABLE_STATUS:
+                    self.breaker.record_success()
+                    return result
+                headers, outcome = self._headers(result), result
+
+            requested = parse_retry_after(headers)
+            if status == 429 and requested is not None and requested > self.max_wait:
+                # e.g. a daily X quota: stop retrying and hold everyone off until it resets
+                self.breaker.open_for(requested)
+            elif status != 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_trial()
+            if attempt == self.max_attempts or (requested is not None and requested > self.max_wait):
+                break
+            if not self.idempotent and status != 429 and not isinstance(outcome, self.unsent_errors):
+                break
+            delay = requested if requested is not None else self.backoff(attempt)
+            logging.warning(f"{self.name} attempt {attempt} failed ({status or type(outcome).__name__}), "
+                            f"retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint(name, **kwargs):
+    # Endpoints are shared process-wide so every caller draws on the same
+    # rate limit and sees the same circuit state; kwargs apply on first use
+    with _endpoints_lock:
+        endpoint = _endpoints.get(name)
+        if endpoint is None:
+            endpoint = ResilientEndpoint(name, **kwargs)
+            _endpoints[name] = endpoint
+        return endpoint
+
+
+def env_rate(name, default):
+    # Per-endpoint rate override, e.g. RATE_LIMIT_X_TWEETS=0.01 (requests per second)
+    key = 'RATE_LIMIT_' + name.upper().replace('.', '_')
+    return float(os.getenv(key, default))
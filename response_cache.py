@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from db_operations import ConnectionManager
+
+
+class ResponseCache:
+    """Cache for OpenAI responses keyed by a hash of (model, messages, params).
+
+    Entries live in an in-memory LRU and, when db_name is given, in a SQLite
+    table so they survive restarts. Each call type has its own TTL; values
+    must be JSON-serialisable.
+    """
+
+    DEFAULT_TTLS = {
+        'hashtags': 24 * 3600,
+        'image': 50 * 60,  # DALL-E URLs expire after about an hour
+    }
+
+    def __init__(self, max_entries=512, ttls=None, db_name=None):
+        self.max_entries = max_entries
+        self.ttls = dict(self.DEFAULT_TTLS, **(ttls or {}))
+        self.db_name = db_name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.manager = None
+        if db_name:
+            self.manager = ConnectionManager.get(db_name)
+            self.manager.ensure_schema(self.create_table)
+
+    def create_table(self):
+        conn = self.manager.connection()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS response_cache
+        (key TEXT PRIMARY KEY,
+         call_type TEXT NOT NULL,
+         value TEXT NOT NULL,
+         expires_at REAL NOT NULL)
+        ''')
+        conn.commit()
+
+    @staticmethod
+    def make_key(model, messages, **params):
+        payload = json.dumps({'model': model, 'messages': messages, 'params': params},
+                             sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        # The key already identifies the call; call_type only picks the TTL in set()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+        value = self._load(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, call_type, key, value):
+        expires_at = time.time() + self.ttls.get(call_type, 3600)
+        self._remember(key, expires_at, value)
+        if self.manager:
+            try:
+                conn = self.manager.connection()
+                conn.execute("INSERT OR REPLACE INTO response_cache (key, call_type, value, expires_at) VALUES (?, ?, ?, ?)",
+                             (key, call_type, json.dumps(value), expires_at))
+                conn.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error writing response cache: {e}")
+
+    def _remember(self, key, expires_at, value):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self, key, now):
+        if not self.manager:
+            return None
+        try:
+            conn = self.manager.connection()
+            row = conn.execute("SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            return value
+        except sqlite3.Error as e:
+            logging.error(f"Error reading response cache: {e}")
+            return None
+
+    def purge_expired(self):
+        now = time.time()
+        with self._lock:
+            for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                del self._entries[key]
+        if self.manager:
+            try:
+                conn = self.manager.connection()
+                conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+                conn.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error purging response cache: {e}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                    'hit_rate': self.hits / total if total else 0.0}
+
+
+def format_cache_stats(stats):
+    return (f"Response cache (this session): {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries in memory")
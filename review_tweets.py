@@ -1,6 +1,12 @@
 from db_operations import DBOperations
-from openai_api import OpenAIClient
+from openai_api import OpenAIClient, response_cache
+from metrics import format_summary, metrics
+from response_cache import format_cache_stats
+from accounts import ACCOUNTS_FILE, account_db, account_dbs, load_account_entries
+import tweet_validator
 import logging
+import os
+import sys
 from config import AnsiColor, set_cmd_title, set_virtual_terminal_level
 
 # Set up logging
@@ -12,6 +18,18 @@ set_virtual_terminal_level()
 # Set the CMD window title
 set_cmd_title("Tweet Review System")
 
+def add_to_queue(tweet_content):
+    if db.add_tweet(tweet_content):
+        print(f"{AnsiColor.OKGREEN}Tweet added to the queue.{AnsiColor.ENDC}")
+        return
+    print(f"{AnsiColor.FAIL}Tweet was not added: {db.last_rejection}.{AnsiColor.ENDC}")
+    fitted = tweet_validator.fit(tweet_content)
+    if tweet_validator.validate(tweet_content) and fitted and not tweet_validator.validate(fitted):
+        # Too long: offer the trimmed version the bot would post
+        print(f"Trimmed to fit: {fitted}")
+        if input("Add the trimmed tweet instead? (y/n): ").lower() == 'y':
+            add_to_queue(fitted)
+
 def generate_additional_tweet():
     print(f"\n{AnsiColor.OKBLUE}Generating a new tweet...{AnsiColor.ENDC}")
     tweet_content = OpenAIClient.generate_tweet_with_hashtags()
@@ -19,18 +37,18 @@ def generate_additional_tweet():
         print(f"{AnsiColor.OKGREEN}Generated tweet: {tweet_content}{AnsiColor.ENDC}")
         confirm = input("Do you want to add this tweet to the queue? (y/n): ").lower()
         if confirm == 'y':
-            db.add_tweet(tweet_content)
-            print(f"{AnsiColor.OKGREEN}Tweet added to the queue.{AnsiColor.ENDC}")
+            add_to_queue(tweet_content)
         else:
             print(f"{AnsiColor.FAIL}Tweet discarded.{AnsiColor.ENDC}")
     else:
         print(f"{AnsiColor.FAIL}Failed to generate a new tweet.{AnsiColor.ENDC}")
 
-def generate_bulk_tweets(count=10):
-    print(f"\n{AnsiColor.OKBLUE}Generating {count} tweets...{AnsiColor.ENDC}")
+def generate_bulk_tweets(count=10, candidates=1):
+    print(f"\n{AnsiColor.OKBLUE}Generating {count} tweets ({candidates} per request)...{AnsiColor.ENDC}")
     tweets = []
-    for i in range(count):
-        tweet_content = OpenAIClient.generate_tweet_with_hashtags()
+    usage = {}
+    # Requests run concurrently; each tweet is printed as soon as it arrives
+    for i, tweet_content in OpenAIClient.generate_tweets_concurrently(count, candidates=candidates, usage=usage):
         if tweet_content:
             print(f"Tweet {i+1}: {tweet_content}")
             tweets.append(tweet_content)
@@ -42,6 +60,9 @@ def generate_bulk_tweets(count=10):
         if confirm == 'y':
             added_count = db.bulk_add_tweets(tweets)
             print(f"{AnsiColor.OKGREEN}{added_count} tweets added to the queue.{AnsiColor.ENDC}")
+            if added_count:
+                print(f"Prompt tokens per stored tweet: {usage.get('prompt_tokens', 0) / added_count:.0f} "
+                      f"over {usage.get('requests', 0)} requests")
         else:
             print(f"{AnsiColor.FAIL}Tweets discarded.{AnsiColor.ENDC}")
     else:
@@ -51,8 +72,7 @@ def create_new_tweet():
     print(f"\n{AnsiColor.OKBLUE}Creating a new tweet...{AnsiColor.ENDC}")
     tweet_content = input(f"{AnsiColor.BOLD}Enter the tweet content: {AnsiColor.ENDC}")
     if tweet_content:
-        db.add_tweet(tweet_content)
-        print(f"{AnsiColor.OKGREEN}Tweet added to the queue.{AnsiColor.ENDC}")
+        add_to_queue(tweet_content)
     else:
         print(f"{AnsiColor.FAIL}Tweet content cannot be empty.{AnsiColor.ENDC}")
 
@@ -61,29 +81,66 @@ def edit_tweet(tweet_id, content):
     print(f"Current content: {content}")
     new_content = input("Enter the new content (or press Enter to keep current): ")
     if new_content:
-        db.cursor.execute("UPDATE tweets SET content = ? WHERE id = ?", (new_content, tweet_id))
-        db.conn.commit()
+        db.update_tweet_content(tweet_id, new_content)
         print(f"{AnsiColor.OKGREEN}Tweet updated successfully.{AnsiColor.ENDC}")
     else:
         print(f"{AnsiColor.WARNING}No changes made.{AnsiColor.ENDC}")
 
-def display_all_tweets():
-    db.cursor.execute("SELECT id, content, status FROM tweets ORDER BY id DESC LIMIT 50")
-    tweets = db.cursor.fetchall()
-    if not tweets:
-        print(f"{AnsiColor.FAIL}No tweets found in the database.{AnsiColor.ENDC}")
-    else:
-        print(f"\n{AnsiColor.HEADER}{'=' * 50}\n--- All Tweets (Last 50) ---\n{'=' * 50}{AnsiColor.ENDC}")
+def display_all_tweets(page_size=50):
+    # Pages through the whole history newest first using keyset pagination
+    after = None
+    page = 1
+    while True:
+        tweets, after = db.get_tweet_page(descending=True, after=after, page_size=page_size)
+        if not tweets:
+            if page == 1:
+                print(f"{AnsiColor.FAIL}No tweets found in the database.{AnsiColor.ENDC}")
+            return
+        print(f"\n{AnsiColor.HEADER}{'=' * 50}\n--- All Tweets (Page {page}) ---\n{'=' * 50}{AnsiColor.ENDC}")
         for tweet in tweets:
             print(f"{AnsiColor.BOLD}ID: {tweet[0]} | Status: {tweet[2]}{AnsiColor.ENDC}")
             print(f"Content: {tweet[1]}")
             print(f"{AnsiColor.OKBLUE}{'-' * 50}{AnsiColor.ENDC}")
+        if after is None:
+            return
+        if input("Press Enter for the next page, or 'q' to stop: ").lower() == 'q':
+            return
+        page += 1
+
+def search_tweets():
+    query = input("Enter keywords or hashtags to search for: ").strip()
+    if not query:
+        print(f"{AnsiColor.FAIL}Search query cannot be empty.{AnsiColor.ENDC}")
+        return
+    status = input("Filter by status (pending/authorized/posted, or Enter for all): ").strip().lower() or None
+    results = db.search(query, status=status)
+    if not results:
+        print(f"{AnsiColor.FAIL}No tweets matched '{query}'.{AnsiColor.ENDC}")
+        return
+    print(f"\n{AnsiColor.HEADER}{'=' * 50}\n--- Search Results ({len(results)}) ---\n{'=' * 50}{AnsiColor.ENDC}")
+    for tweet_id, _, status, highlighted, _ in results:
+        print(f"{AnsiColor.BOLD}ID: {tweet_id} | Status: {status}{AnsiColor.ENDC}")
+        print(f"Content: {highlighted}")
+        print(f"{AnsiColor.OKBLUE}{'-' * 50}{AnsiColor.ENDC}")
+
+def display_queue_depth():
+    counts = db.get_status_counts()
+    summary = " | ".join(f"{status}: {counts.get(status, 0)}" for status in ('pending', 'authorized', 'posting', 'failed', 'posted'))
+    print(f"{AnsiColor.OKBLUE}Queue depth - {summary}{AnsiColor.ENDC}")
 
 def perform_maintenance():
     print(f"\n{AnsiColor.OKBLUE}Performing database maintenance...{AnsiColor.ENDC}")
     try:
-        db.perform_maintenance()
+        report = db.perform_maintenance()
+        if report['needs_conversion']:
+            print(f"{AnsiColor.WARNING}This database predates incremental auto-vacuum. Converting it runs a full "
+                  f"VACUUM that locks the database until it finishes; stop the bot first.{AnsiColor.ENDC}")
+            if input("Convert now? (y/n): ").lower() == 'y':
+                report = db.perform_maintenance(convert=True)
         print(f"{AnsiColor.OKGREEN}Maintenance completed successfully.{AnsiColor.ENDC}")
+        if report['converted']:
+            print("Database converted to incremental auto-vacuum.")
+        print(f"Pages freed: {report['pages_freed']} ({report['pages_remaining']} remaining) in {report['seconds']:.2f}s")
     except Exception as e:
         print(f"{AnsiColor.FAIL}An error occurred during maintenance: {e}{AnsiColor.ENDC}")
     print(f"{AnsiColor.WARNING}You can check the log file for detailed information.{AnsiColor.ENDC}")
@@ -107,33 +164,66 @@ def remove_specific_tweet():
     else:
         print(f"{AnsiColor.FAIL}Tweet not found.{AnsiColor.ENDC}")
 
-def review_tweets():
+def choose_account(target=None):
+    # python review_tweets.py [account name | db file]. Without an argument a
+    # single configured account is picked directly and several are offered
+    # in a menu. Returns (db file, accounts.json entry or None).
+    if target and target.endswith('.db'):
+        return target, None
+    entries = load_account_entries(enabled_only=False)[0] if os.path.exists(ACCOUNTS_FILE) else []
+    if target:
+        for entry in entries:
+            if entry['name'] == target:
+                return account_db(entry), entry
+        print(f"{AnsiColor.FAIL}Unknown account '{target}' (not in {ACCOUNTS_FILE}).{AnsiColor.ENDC}")
+        sys.exit(1)
+    if not entries:
+        return 'tweets.db', None
+    if len(entries) == 1:
+        return account_db(entries[0]), entries[0]
+    for i, entry in enumerate(entries, 1):
+        print(f"{AnsiColor.OKCYAN}{i}. {entry['name']} ({account_db(entry)}){AnsiColor.ENDC}")
+    while True:
+        choice = input("Which account do you want to review? ").strip()
+        if choice.isdigit() and 1 <= int(choice) <= len(entries):
+            entry = entries[int(choice) - 1]
+            return account_db(entry), entry
+
+def review_tweets(db_name='tweets.db'):
     global db
-    db = DBOperations()
+    db = DBOperations(db_name)
     db.connect()
 
     while True:
         print(f"\n{AnsiColor.HEADER}{'=' * 50}\n--- Tweet Review Menu ---\n{'=' * 50}{AnsiColor.ENDC}")
+        display_queue_depth()
         print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}1. Review pending tweets{AnsiColor.ENDC}")
         print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}2. Generate additional tweet{AnsiColor.ENDC}")
-        print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}3. Generate 10 tweets in bulk{AnsiColor.ENDC}")
+        print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}3. Generate tweets in bulk{AnsiColor.ENDC}")
         print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}4. Create a new tweet{AnsiColor.ENDC}")
         print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}5. Edit a specific tweet{AnsiColor.ENDC}")
         print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}6. Remove a specific tweet{AnsiColor.ENDC}")
         print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}7. Display all tweets{AnsiColor.ENDC}")
         print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}8. Perform database maintenance{AnsiColor.ENDC}")
-        print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}9. Exit{AnsiColor.ENDC}")
+        print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}9. Search tweets{AnsiColor.ENDC}")
+        print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}10. Show API usage and cost summary{AnsiColor.ENDC}")
+        print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}11. Retry failed posts{AnsiColor.ENDC}")
+        print(f"{AnsiColor.BOLD}{AnsiColor.OKCYAN}12. Exit{AnsiColor.ENDC}")
         
-        choice = input(f"{AnsiColor.HEADER}Enter your choice (1-9): {AnsiColor.ENDC}")
+        choice = input(f"{AnsiColor.HEADER}Enter your choice (1-12): {AnsiColor.ENDC}")
 
         if choice == '1':
             pending_tweets = db.get_pending_tweets()
-            if not pending_tweets:
+            if not db.get_status_counts().get('pending'):
                 print(f"{AnsiColor.FAIL}No pending tweets to review.{AnsiColor.ENDC}")
             else:
                 for tweet_id, content in pending_tweets:
                     print(f"\n{AnsiColor.HEADER}{'=' * 50}\nTweet ID: {tweet_id}\n{'=' * 50}{AnsiColor.ENDC}")
                     print(f"Content: {content}")
+                    db.cursor.execute("SELECT duplicate_of FROM tweets WHERE id = ?", (tweet_id,))
+                    duplicate_of = db.cursor.fetchone()
+                    if duplicate_of and duplicate_of[0]:
+                        print(f"{AnsiColor.WARNING}Possible near-duplicate of tweet {duplicate_of[0]}{AnsiColor.ENDC}")
                     action = input("Enter 'a' to authorize, 'r' to remove, 'e' to edit, or 's' to skip: ").lower()
                     
                     if action == 'a':
@@ -153,7 +243,12 @@ def review_tweets():
             generate_additional_tweet()
 
         elif choice == '3':
-            generate_bulk_tweets()
+            count = input("How many tweets should be generated? (default 10): ").strip()
+            candidates = input("Candidates per request (default 1): ").strip()
+            if not all(value.isdigit() and int(value) > 0 for value in (count, candidates) if value):
+                print(f"{AnsiColor.FAIL}Please enter a positive whole number.{AnsiColor.ENDC}")
+            else:
+                generate_bulk_tweets(int(count) if count else 10, int(candidates) if candidates else 1)
 
         elif choice == '4':
             create_new_tweet()
@@ -180,6 +275,18 @@ def review_tweets():
             perform_maintenance()
 
         elif choice == '9':
+            search_tweets()
+
+        elif choice == '10':
+            print(f"\n{AnsiColor.HEADER}{'=' * 50}\n--- API Usage Summary ---\n{'=' * 50}{AnsiColor.ENDC}")
+            print(format_summary(metrics.summary(tweet_dbs=account_dbs())))
+            print(format_cache_stats(response_cache.stats()))
+
+        elif choice == '11':
+            requeued = db.requeue_failed_tweets()
+            print(f"{AnsiColor.OKGREEN}{requeued} failed tweets returned to the posting queue.{AnsiColor.ENDC}")
+
+        elif choice == '12':
             print(f"{AnsiColor.OKBLUE}Exiting tweet review.{AnsiColor.ENDC}")
             break
 
@@ -190,5 +297,10 @@ def review_tweets():
     print(f"{AnsiColor.OKBLUE}Review session ended.{AnsiColor.ENDC}")
 
 if __name__ == "__main__":
+    db_name, account = choose_account(sys.argv[1] if len(sys.argv) > 1 else None)
+    if account:
+        # Generated tweets use the account's own persona
+        OpenAIClient.persona = account.get('persona', account['name'])
+        set_cmd_title(f"Tweet Review System ({account['name']})")
     OpenAIClient.load_recent_topics()
-    review_tweets()
+    review_tweets(db_name)
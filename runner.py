@@ -0,0 +1,47 @@
+import asyncio
+import logging
+import sys
+from dotenv import load_dotenv
+from accounts import ACCOUNTS_FILE, load_account_entries
+from bot import XBot
+from config import AnsiColor, set_cmd_title, set_virtual_terminal_level
+
+# Runs several accounts in one process and one event loop:
+#   python runner.py [accounts.json]
+# Each account has its own queue database, persona and posting schedule;
+# HTTP connections, OpenAI rate limits and caches are shared. See
+# accounts.example.json for the config format.
+
+set_virtual_terminal_level()
+load_dotenv()
+logging.basicConfig(level=logging.INFO, format=f'{AnsiColor.HEADER}%(asctime)s{AnsiColor.ENDC} - %(levelname)s - %(message)s')
+
+
+def load_accounts(path):
+    accounts, stagger = load_account_entries(path)
+    return [XBot.from_config(entry) for entry in accounts], stagger
+
+
+async def run_account(bot, start_delay):
+    # One account failing must not stop the others
+    try:
+        await bot.run(start_delay)
+    except Exception as e:
+        bot.log.error(f"{AnsiColor.FAIL}Account stopped: {e}{AnsiColor.ENDC}", exc_info=True)
+
+
+async def main(bots, stagger):
+    # Stagger the first posting cycles so accounts don't all post at once
+    await asyncio.gather(*(run_account(bot, i * stagger) for i, bot in enumerate(bots)))
+
+
+if __name__ == "__main__":
+    config_path = sys.argv[1] if len(sys.argv) > 1 else ACCOUNTS_FILE
+    bots, stagger = load_accounts(config_path)
+    set_cmd_title(f"X Cerberus Bot ({len(bots)} accounts)")
+    logging.info(f"{AnsiColor.OKBLUE}Starting {len(bots)} accounts: {', '.join(bot.name for bot in bots)}{AnsiColor.ENDC}")
+    try:
+        asyncio.run(main(bots, stagger))
+    finally:
+        for bot in bots:
+            bot.close()
@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import random
+import time
+
+from config import AnsiColor
+
+# What to do with runs that fell due while the process was down
+MISSED_POLICIES = ('skip', 'run_once', 'catch_up')
+
+
+class ScheduledTask:
+    def __init__(self, name, action, interval, jitter=0.0, concurrency=1, missed='run_once', initial_delay=0.0,
+                 max_catch_up=3):
+        # action is a coroutine function; it may return a number of seconds to
+        # override the delay before its next run (e.g. to back off)
+        if missed not in MISSED_POLICIES:
+            raise ValueError(f"Unknown missed-run policy: {missed}")
+        self.name = name
+        self.action = action
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = concurrency
+        self.missed = missed
+        self.initial_delay = initial_delay
+        self.max_catch_up = max_catch_up
+        self.next_run = None
+        self.entry = None  # sequence number of the task's live queue entry
+        self.backlog = 0  # extra catch-up runs still owed
+        self.running = 0
+
+    def delay(self):
+        return self.interval + random.uniform(0, self.jitter)
+
+
+class Scheduler:
+    """Runs tasks on independent cadences from a single priority queue.
+
+    Each task runs every interval seconds plus a random jitter of up to
+    jitter seconds, with at most `concurrency` runs in flight (a run that
+    falls due while the limit is reached is skipped). When a store is given
+    (a DBOperations), next-run times are saved after every change, so a
+    restart resumes the schedule; runs missed while stopped are handled per
+    task as 'skip' (wait for the next slot), 'run_once' (run now, then
+    resume) or 'catch_up' (run each missed slot, up to max_catch_up extra).
+    """
+
+    def __init__(self, store=None, log=None):
+        self.store = store
+        self.log = log or logging.getLogger()
+        self.tasks = {}
+        self._queue = []  # (next_run, sequence, task name)
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._running = set()
+
+    def add(self, name, action, interval, **options):
+        self.tasks[name] = ScheduledTask(name, action, interval, **options)
+
+    def _push(self, task, when):
+        task.next_run = when
+        task.entry = next(self._sequence)
+        heapq.heappush(self._queue, (when, task.entry, task.name))
+        if self.store:
+            self.store.save_schedule(task.name, next_run=when)
+        self._wakeup.set()
+
+    def trigger(self, name):
+        # Runs a task as soon as possible instead of waiting for its slot
+        self._push(self.tasks[name], time.time())
+
+    def _initial_time(self, task, saved_next, now):
+        if saved_next is None:
+            return now + task.initial_delay
+        if saved_next >= now:
+            return saved_next
+        missed = math.floor((now - saved_next) / task.interval) + 1
+        if task.missed == 'skip':
+            return saved_next + missed * task.interval
+        if task.missed == 'catch_up':
+            task.backlog = min(missed - 1, task.max_catch_up)
+        self.log.info(f"{AnsiColor.WARNING}{task.name} missed {missed} run(s) while stopped; "
+                      f"policy {task.missed}{AnsiColor.ENDC}")
+        return now
+
+    def load(self):
+        saved = self.store.load_schedule() if self.store else {}
+        now = time.time()
+        for task in self.tasks.values():
+            self._push(task, self._initial_time(task, saved.get(task.name), now))
+
+    async def _execute(self, task, started):
+        override = None
+        error = None
+        try:
+            override = await task.action()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e)
+            self.log.error(f"{AnsiColor.FAIL}Scheduled task {task.name} failed: {e}{AnsiColor.ENDC}", exc_info=True)
+        finally:
+            task.running -= 1
+        duration = time.time() - started
+        if self.store:
+            self.store.save_schedule(task.name, last_run=started, duration=duration, error=error)
+        if task.backlog:
+            task.backlog -= 1
+            self._push(task, time.time())
+        elif isinstance(override, (int, float)) and not isinstance(override, bool):
+            self._push(task, time.time() + override)
+
+    def _start(self, task, now):
+        if task.running >= task.concurrency:
+            self.log.warning(f"{AnsiColor.WARNING}{task.name} still running ({task.running}), skipping this run{AnsiColor.ENDC}")
+            self._push(task, now + task.delay())
+            return
+        task.running += 1
+        # The next slot is set from the start time; a returned override or a
+        # catch-up run replaces it when this run finishes
+        self._push(task, now + task.delay())
+        run = asyncio.create_task(self._execute(task, now), name=f"scheduled-{task.name}")
+        self._running.add(run)
+        run.add_done_callback(self._running.discard)
+
+    async def run(self):
+        self.load()
+        try:
+            while not self._stop.is_set():
+                # Drop queue entries superseded by a later _push for the same task
+                while self._queue and self._queue[0][1] != self.tasks[self._queue[0][2]].entry:
+                    heapq.heappop(self._queue)
+                if not self._queue:
+                    await self._wait(None)
+                    continue
+                when, _, name = self._queue[0]
+                now = time.time()
+                if when > now:
+                    await self._wait(when - now)
+                    continue
+                heapq.heappop(self._queue)
+                self._start(self.tasks[name], now)
+        finally:
+            for run in list(self._running):
+                run.cancel()
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _wait(self, timeout):
+        self._wakeup.clear()
+        waiters = [asyncio.create_task(self._wakeup.wait()), asyncio.create_task(self._stop.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def stop(self):
+        self._stop.set()
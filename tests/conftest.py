@@ -0,0 +1,94 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# The bot's modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Module-level trackers (metrics, topics, hashtags) use this instead of the real tweets.db
+_scratch = tempfile.mkdtemp(prefix='cerberus-tests-')
+for _variable in ('METRICS_DB', 'TOPICS_DB', 'HASHTAGS_DB'):
+    os.environ.setdefault(_variable, os.path.join(_scratch, 'tweets.db'))
+# openai_api builds its client at import; no request is ever sent with this key
+os.environ.setdefault('OPENAI_API_KEY', 'test-key')
+
+# config.py imports winreg for the Windows console settings, which the tests
+# never touch; an empty module lets bot.py import on other platforms
+try:
+    import winreg  # noqa: F401
+except ImportError:
+    sys.modules['winreg'] = types.ModuleType('winreg')
+
+
+class FakeServer:
+    """Local HTTP/1.1 server that answers from a script and records what it saw.
+
+    Each request takes the next (status, body, headers) from `script`, or asks
+    `handler(method, path, body)` when the script is empty; `delay` seconds are
+    slept before answering. `connections` counts accepted TCP connections.
+    """
+
+    def __init__(self):
+        self.script = []
+        self.handler = None
+        self.delay = 0.0
+        self.requests = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                with fake._lock:
+                    fake.connections += 1
+                super().setup()
+
+            def answer(self):
+                body = self.rfile.read(int(self.headers.get('content-length') or 0))
+                with fake._lock:
+                    fake.requests.append((self.command, self.path, dict(self.headers), body))
+                    scripted = fake.script.pop(0) if fake.script else None
+                if scripted is None:
+                    scripted = fake.handler(self.command, self.path, body) if fake.handler else (200, {}, {})
+                status, payload, headers = (tuple(scripted) + ({},))[:3]
+                time.sleep(fake.delay)
+                data = json.dumps(payload).encode('utf-8') if status != 204 else b''
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = answer
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_server():
+    server = FakeServer()
+    yield server
+    server.close()
@@ -0,0 +1,110 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+import bot as bot_module
+from test_x_client import FakeUpload, client
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self.body
+
+
+class FakeX:
+    # Stands in for XClient; answers post_tweet from a script of responses or exceptions
+    def __init__(self, *script):
+        self.script = list(script)
+        self.posts = []
+
+    def post_tweet(self, text, media_ids=None):
+        self.posts.append(text)
+        outcome = self.script.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_bot(tmp_path, *script):
+    bot = bot_module.XBot(name="test", db_name=str(tmp_path / "tweets.db"), max_post_attempts=3)
+    bot.x = FakeX(*script)
+    bot.db.connect()
+    tweet_id = bot.db.add_tweet("Self-custody is a habit, not a feature. #Privacy")
+    bot.db.authorize_tweet(tweet_id)
+    return bot, tweet_id
+
+
+def tweet_row(bot, tweet_id):
+    bot.db.cursor.execute("SELECT status, attempts, lease_owner, x_post_id FROM tweets WHERE id = ?", (tweet_id,))
+    return bot.db.cursor.fetchone()
+
+
+def test_server_error_releases_claim(tmp_path):
+    bot, tweet_id = make_bot(tmp_path, FakeResponse(500, {'title': 'Internal Server Error'}))
+    asyncio.run(bot.post_authorized_tweet())
+    assert tweet_row(bot, tweet_id) == ('authorized', 1, None, None)
+    bot.close()
+
+
+def test_repeated_failures_end_in_failed(tmp_path):
+    bot, tweet_id = make_bot(tmp_path, *[FakeResponse(503, {}) for _ in range(3)])
+    for _ in range(4):
+        asyncio.run(bot.post_authorized_tweet())
+    assert tweet_row(bot, tweet_id) == ('failed', 3, None, None)
+    assert len(bot.x.posts) == 3
+    bot.close()
+
+
+def test_duplicate_rejection_counts_as_posted(tmp_path):
+    duplicate = FakeResponse(403, {'detail': 'You are not allowed to create a Tweet with duplicate content.'})
+    bot, tweet_id = make_bot(tmp_path, duplicate)
+    asyncio.run(bot.post_authorized_tweet())
+    assert tweet_row(bot, tweet_id)[0] == 'posted'
+    bot.close()
+
+
+def test_unexpected_error_releases_claim_and_propagates(tmp_path):
+    bot, tweet_id = make_bot(tmp_path, RuntimeError("client bug"))
+    with pytest.raises(RuntimeError):
+        asyncio.run(bot.post_authorized_tweet())
+    assert tweet_row(bot, tweet_id) == ('authorized', 1, None, None)
+    bot.close()
+
+
+def test_success_records_post_id(tmp_path):
+    bot, tweet_id = make_bot(tmp_path, FakeResponse(201, {'data': {'id': '1850000000000000000'}}))
+    asyncio.run(bot.post_authorized_tweet())
+    assert tweet_row(bot, tweet_id) == ('posted', 1, None, '1850000000000000000')
+    bot.close()
+
+
+class FakeMediaStore:
+    def open(self, digest):
+        return io.BytesIO(b'video'), 5
+
+
+def test_failed_processing_keeps_upload_state_usable(tmp_path, fake_server, monkeypatch):
+    bot, _ = make_bot(tmp_path)
+    monkeypatch.setattr(bot_module, 'media_store', FakeMediaStore())
+    fake_server.handler = FakeUpload(processing=['failed'])
+    bot.x = client(fake_server.url)
+    text = "Self-custody is a habit, not a feature. #Privacy"
+    for _ in range(2):
+        # The retry scans upload state for stale entries; a failed upload must not break it
+        result = bot.post_tweet_with_media(text, 'abc', 'video/mp4')
+        assert result['error'] == 'MediaProcessingError'
+    assert list(bot.uploads['abc']) == ['started']
+    bot.close()
+
+
+def test_from_config_reads_lease_seconds(tmp_path):
+    bot = bot_module.XBot.from_config({'name': 'test', 'db': str(tmp_path / "tweets.db"), 'lease_seconds': 120})
+    assert bot.lease_seconds == 120
+    bot.close()
@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+
+from db_operations import ConnectionManager, DBOperations
+import tweet_validator
+
+
+def test_close_keeps_other_users_connections(tmp_path):
+    path = str(tmp_path / "tweets.db")
+    bot, metrics = DBOperations(path), DBOperations(path)
+    bot.connect()
+    metrics.connect()
+    metrics.add_tweet("First tweet about zero knowledge proofs #zk")
+
+    bot.close()
+    # The manager is shared, so metrics' connection must survive bot.close()
+    assert metrics.count_tweets() == 1
+
+    manager = metrics.manager
+    metrics.close()
+    assert manager._connections == []
+
+
+def test_connection_used_from_another_thread_survives_close(tmp_path):
+    path = str(tmp_path / "tweets.db")
+    db, other = DBOperations(path), DBOperations(path)
+    db.connect()
+    other.connect()
+    ready, closed, results = threading.Event(), threading.Event(), []
+
+    def worker():
+        other.add_tweet("Tweet stored from a worker thread #threads")
+        ready.set()
+        closed.wait()
+        results.append(other.count_tweets())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    ready.wait()
+    db.close()
+    closed.set()
+    thread.join()
+    assert results == [1]
+    other.close()
+
+
+def test_schema_set_up_once_across_threads(tmp_path):
+    manager = ConnectionManager(str(tmp_path / "tweets.db"))
+    calls = []
+    start = threading.Barrier(8)
+
+    def setup():
+        calls.append(1)
+        manager.connection()
+
+    def worker():
+        start.wait()
+        manager.ensure_schema(setup)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    manager.close_all()
+
+
+def legacy_database(path):
+    # A file created before auto_vacuum=INCREMENTAL was set on new connections
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE filler (data BLOB)")
+    conn.commit()
+    conn.close()
+
+
+def test_background_maintenance_never_converts(tmp_path):
+    path = str(tmp_path / "tweets.db")
+    legacy_database(path)
+    db = DBOperations(path)
+    db.connect()
+    assert db.auto_vacuum_mode() == 0
+
+    reports = []
+    db.start_background_maintenance(on_complete=reports.append).join()
+    assert reports[0]['needs_conversion'] and not reports[0]['converted']
+    assert db.auto_vacuum_mode() == 0
+
+    report = db.perform_maintenance(convert=True)
+    assert report['converted']
+    assert db.auto_vacuum_mode() == 2
+    db.close()
+
+
+def test_rejected_tweet_records_reason(tmp_path):
+    db = DBOperations(str(tmp_path / "tweets.db"))
+    db.connect()
+    tweet = "Self-custody is a habit, not a feature. #Privacy"
+    assert db.add_tweet(tweet)
+    assert db.last_rejection is None
+    assert db.add_tweet(tweet) is None
+    assert db.last_rejection.startswith("near-duplicate of tweet 1")
+    too_long = "x" * (tweet_validator.MAX_WEIGHTED_LENGTH + 1)
+    assert db.add_tweet(too_long) is None
+    assert db.last_rejection == tweet_validator.validate(too_long)
+    db.close()
@@ -0,0 +1,59 @@
+import random
+
+import dedup
+from db_operations import DBOperations
+
+WORDS = ("privacy proofs zero knowledge rollups ledger consensus validators staking bridge wallet keys "
+         "signature hash merkle tree layer scaling fees gas mempool block finality oracle governance token "
+         "custody audit exploit patch network nodes peers latency throughput encryption secrets").split()
+
+
+def tweet(rng, words=25):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def edit_words(rng, text, edits=3):
+    words = text.split()
+    for _ in range(edits):
+        words[rng.randrange(len(words))] = rng.choice(WORDS)
+    return ' '.join(words)
+
+
+def test_probe_radius_covers_threshold():
+    distance = dedup.max_distance(0.85)
+    assert distance == 9
+    # Pigeonhole: some band must differ in at most radius bits
+    assert len(dedup.BAND_WIDTHS) * (dedup.probe_radius(distance) + 1) > distance
+
+
+def test_probes_find_every_fingerprint_within_threshold():
+    rng = random.Random(7)
+    for _ in range(500):
+        a = rng.getrandbits(64)
+        b = a
+        for bit in rng.sample(range(64), rng.randint(0, dedup.max_distance(0.85))):
+            b ^= 1 << bit
+        probes = dedup.probes(a, 0.85)
+        assert any(value in probes[band] for band, value in enumerate(dedup.bands(b)))
+
+
+def test_near_duplicate_recall(tmp_path):
+    db = DBOperations(str(tmp_path / "tweets.db"))
+    db.connect()
+    db.duplicate_policy = 'off'
+    rng = random.Random(42)
+    originals = [tweet(rng) for _ in range(200)]
+    ids = {db.add_tweet(text): text for text in originals}
+    assert None not in ids
+
+    expected = found = 0
+    for tweet_id, text in ids.items():
+        edited = edit_words(rng, text)
+        if dedup.similarity(dedup.simhash(text), dedup.simhash(edited)) < db.duplicate_similarity:
+            continue
+        expected += 1
+        match = db.find_near_duplicate(edited)
+        found += match is not None
+    assert expected > 50
+    assert found == expected
+    db.close()
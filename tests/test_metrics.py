@@ -0,0 +1,72 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from db_operations import DBOperations
+from metrics import MetricsRecorder, call_cost
+
+
+def call(created_at, latency_ms, prompt_tokens):
+    return {'created_at': created_at, 'call_type': 'tweet', 'model': 'gpt-4o-mini', 'outcome': 'ok',
+            'prompt_tokens': prompt_tokens, 'completion_tokens': 50, 'cached_tokens': 0, 'images': 0,
+            'latency_ms': latency_ms}
+
+
+def add_tweet(db, text, created, posted=None):
+    tweet_id = db.add_tweet(text)
+    db.cursor.execute("UPDATE tweets SET created_at = ?, status = ?, posted_at = ? WHERE id = ?",
+                      (created.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                       'posted' if posted else 'pending', posted, tweet_id))
+    db.conn.commit()
+    return tweet_id
+
+
+def test_summary_window_excludes_older_rows(tmp_path):
+    recorder = MetricsRecorder(str(tmp_path / "tweets.db"))
+    db = recorder.db
+    db.connect()
+    db.duplicate_policy = 'off'
+    now = datetime.now().astimezone()
+    old = now - timedelta(days=10)
+    since = time.time() - 86400
+
+    db.record_model_calls([call(old.timestamp(), 5000, 10000) for _ in range(3)]
+                          + [call(time.time(), 100, 400), call(time.time(), 200, 400)])
+    archived = add_tweet(db, "An old tweet that has since been archived", old, old.replace(tzinfo=None))
+    db.archive_tweets("id = ?", [archived])
+    add_tweet(db, "An old tweet posted long ago", old, old.replace(tzinfo=None))
+    add_tweet(db, "An old tweet never posted", old)
+    add_tweet(db, "A new tweet posted today", now, now.replace(tzinfo=None))
+    add_tweet(db, "A new tweet still pending", now)
+
+    summary = recorder.summary(since)
+    assert summary['stored_tweets'] == 2
+    assert summary['posted_tweets'] == 1
+    assert summary['calls']['tweet']['calls'] == 2
+    assert summary['calls']['tweet']['p95_ms'] == 200
+    window_cost = 2 * call_cost('gpt-4o-mini', 400, 0, 50)
+    assert abs(summary['cost_per_posted'] - window_cost) < 1e-12
+
+    everything = recorder.summary()
+    assert everything['posted_tweets'] == 3
+    assert everything['calls']['tweet']['p95_ms'] == 5000
+    db.close()
+
+
+def test_summary_counts_tweets_of_every_account(tmp_path):
+    recorder = MetricsRecorder(str(tmp_path / "tweets.db"))
+    recorder.db.connect()
+    recorder.db.record_model_calls([call(time.time(), 100, 400) for _ in range(3)])
+    other = DBOperations(str(tmp_path / "cerberus2.db"))
+    other.connect()
+    now = datetime.now().astimezone()
+    add_tweet(recorder.db, "Posted by the first account", now, now.replace(tzinfo=None))
+    add_tweet(other, "Posted by the second account", now, now.replace(tzinfo=None))
+    add_tweet(other, "Still pending for the second account", now)
+
+    dbs = [str(tmp_path / name) for name in ("tweets.db", "cerberus2.db", "never-run.db")]
+    summary = recorder.summary(tweet_dbs=dbs)
+    assert (summary['stored_tweets'], summary['posted_tweets']) == (3, 2)
+    assert abs(summary['cost_per_posted'] - 3 * call_cost('gpt-4o-mini', 400, 0, 50) / 2) < 1e-12
+    assert not (tmp_path / "never-run.db").exists()
+    other.close()
+    recorder.db.close()
@@ -0,0 +1,33 @@
+import threading
+import time
+
+from db_operations import ConnectionManager
+from openai_api import OpenAIClient
+
+
+def test_bulk_runs_reuse_worker_connections(tmp_path, monkeypatch):
+    manager = ConnectionManager.get(str(tmp_path / "tweets.db"))
+    in_flight = []
+    lock = threading.Lock()
+    peak = [0]
+
+    def fake_generate(n):
+        # Like the trackers, each call opens (or reuses) its thread's connection
+        manager.connection()
+        with lock:
+            in_flight.append(1)
+            peak[0] = max(peak[0], len(in_flight))
+        time.sleep(0.01)
+        with lock:
+            in_flight.pop()
+        return [f"tweet {i}" for i in range(n)], 10
+
+    monkeypatch.setattr(OpenAIClient, 'generate_candidates_with_hashtags', staticmethod(fake_generate))
+    usage = {}
+    for _ in range(5):
+        tweets = list(OpenAIClient.generate_tweets_concurrently(12, max_workers=3, candidates=2, usage=usage))
+        assert sorted(index for index, _ in tweets) == list(range(12))
+    assert usage == {'prompt_tokens': 300, 'requests': 30}
+    assert peak[0] <= 3
+    assert len(manager._connections) <= OpenAIClient.bulk_concurrency
+    manager.close_all()
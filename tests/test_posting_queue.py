@@ -0,0 +1,74 @@
+import multiprocessing
+import time
+
+from db_operations import DBOperations
+
+WORKERS = 4
+TWEETS = 200
+
+
+def authorized_queue(path, count):
+    db = DBOperations(path)
+    db.connect()
+    db.duplicate_policy = 'off'
+    db.bulk_add_tweets([f"Queued tweet number {i}" for i in range(count)])
+    db.cursor.execute("UPDATE tweets SET status = 'authorized'")
+    db.conn.commit()
+    return db
+
+
+def drain(path, worker, claimed):
+    # One posting process: claim, "post", complete until the queue is empty
+    db = DBOperations(path)
+    db.connect()
+    while True:
+        claim = db.claim_next_tweet(worker, lease_seconds=60)
+        if claim is None:
+            break
+        claimed.put(claim[0])
+        db.complete_post(claim[0], f"x-{claim[0]}")
+    db.close()
+
+
+def test_processes_never_claim_the_same_tweet(tmp_path):
+    path = str(tmp_path / "tweets.db")
+    db = authorized_queue(path, TWEETS)
+    context = multiprocessing.get_context()
+    claimed = context.Queue()
+    workers = [context.Process(target=drain, args=(path, f"worker-{i}", claimed)) for i in range(WORKERS)]
+    for process in workers:
+        process.start()
+    ids = [claimed.get(timeout=60) for _ in range(TWEETS)]
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    assert len(ids) == len(set(ids)) == TWEETS
+    assert db.get_status_counts() == {'posted': TWEETS}
+    db.close()
+
+
+def test_expired_leases_stop_after_max_attempts(tmp_path):
+    db = authorized_queue(str(tmp_path / "tweets.db"), 1)
+    for attempt in range(1, 4):
+        # A worker that dies mid-post never releases; its lease expires at once
+        claim = db.claim_next_tweet("dead-worker", lease_seconds=0, max_attempts=3)
+        assert claim[2] == attempt
+        assert claim[3] == (attempt > 1)
+        time.sleep(0.01)
+
+    assert db.claim_next_tweet("worker", lease_seconds=0, max_attempts=3) is None
+    db.cursor.execute("SELECT status, attempts, last_error FROM tweets")
+    assert db.cursor.fetchone() == ('failed', 3, 'lease expired on the last attempt')
+    db.close()
+
+
+def test_release_and_retry_until_failed(tmp_path):
+    db = authorized_queue(str(tmp_path / "tweets.db"), 1)
+    statuses = []
+    for _ in range(3):
+        tweet_id = db.claim_next_tweet("worker", max_attempts=3)[0]
+        statuses.append(db.release_tweet(tweet_id, "worker", "HTTP 503", max_attempts=3))
+    assert statuses == ['authorized', 'authorized', 'failed']
+    assert db.claim_next_tweet("worker", max_attempts=3) is None
+    db.close()
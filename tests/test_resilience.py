@@ -0,0 +1,106 @@
+import itertools
+import socket
+import time
+
+import pytest
+import requests
+
+from resilience import CircuitOpenError, ResilientEndpoint
+from x_client import TRANSIENT_ERRORS, XClient
+
+names = itertools.count()
+
+
+def endpoint(**options):
+    options = dict(dict(rate=1000, capacity=1000, base_delay=0.01, transient_errors=TRANSIENT_ERRORS), **options)
+    return ResilientEndpoint(f"test.{next(names)}", **options)
+
+
+def test_retry_after_is_honoured(fake_server):
+    fake_server.script = [(503, {}, {'Retry-After': '0.3'}), (200, {'ok': True})]
+    start = time.monotonic()
+    response = endpoint().call(lambda: requests.get(fake_server.url))
+    assert response.status_code == 200
+    assert time.monotonic() - start >= 0.3
+    assert len(fake_server.requests) == 2
+
+
+def test_long_retry_after_opens_circuit(fake_server):
+    fake_server.script = [(429, {}, {'Retry-After': '3600'})]
+    api = endpoint(max_wait=10)
+    assert api.call(lambda: requests.get(fake_server.url)).status_code == 429
+    with pytest.raises(CircuitOpenError):
+        api.call(lambda: requests.get(fake_server.url))
+    assert len(fake_server.requests) == 1
+
+
+def test_circuit_opens_after_repeated_failures(fake_server):
+    fake_server.handler = lambda method, path, body: (500, {})
+    api = endpoint(max_attempts=3, failure_threshold=3, reset_timeout=60)
+    assert api.call(lambda: requests.get(fake_server.url)).status_code == 500
+    assert len(fake_server.requests) == 3
+    with pytest.raises(CircuitOpenError):
+        api.call(lambda: requests.get(fake_server.url))
+    assert len(fake_server.requests) == 3
+
+
+def test_rate_limited_trial_does_not_lock_the_circuit(fake_server):
+    fake_server.script = [(503, {}), (503, {}), (429, {}, {'Retry-After': '0'}), (200, {'ok': True})]
+    api = endpoint(max_attempts=1, failure_threshold=2, reset_timeout=0.2)
+    api.breaker.max_pause = 0  # a stuck trial raises CircuitOpenError instead of waiting
+    for _ in range(2):
+        assert api.call(lambda: requests.get(fake_server.url)).status_code == 503
+    time.sleep(0.25)
+    # The half-open trial is rate limited; the circuit must let the next call try again
+    assert api.call(lambda: requests.get(fake_server.url)).status_code == 429
+    assert api.call(lambda: requests.get(fake_server.url)).status_code == 200
+    assert len(fake_server.requests) == 4
+
+
+def test_token_bucket_limits_rate(fake_server):
+    api = endpoint(rate=20, capacity=1)
+    start = time.monotonic()
+    for _ in range(5):
+        api.call(lambda: requests.get(fake_server.url))
+    # The first call uses the initial token, the other four wait 1/20 s each
+    assert time.monotonic() - start >= 0.19
+
+
+def client(url):
+    x = XClient(None, name=f"test{next(names)}", session=requests.Session(), timeout=(1, 0.5))
+    x.tweet_url = url
+    x.tweets.bucket.rate = x.tweets.bucket.tokens = x.tweets.bucket.capacity = 1000
+    x.tweets.base_delay = 0.01
+    return x
+
+
+def test_tweet_not_retried_on_server_error(fake_server):
+    fake_server.script = [(503, {'title': 'Service Unavailable'})]
+    assert client(fake_server.url).post_tweet("hello").status_code == 503
+    assert len(fake_server.requests) == 1
+
+
+def test_tweet_not_retried_on_read_timeout(fake_server):
+    fake_server.delay = 1.0
+    with pytest.raises(requests.ReadTimeout):
+        client(fake_server.url).post_tweet("hello")
+    assert len(fake_server.requests) == 1
+
+
+def test_tweet_retried_on_rate_limit(fake_server):
+    fake_server.script = [(429, {}, {'Retry-After': '0'}), (201, {'data': {'id': '1'}})]
+    assert client(fake_server.url).post_tweet("hello").status_code == 201
+    assert len(fake_server.requests) == 2
+
+
+def test_tweet_retried_when_connection_refused():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    x = client(f"http://127.0.0.1:{port}/2/tweets")
+    attempts = []
+    original = x.session.post
+    x.session.post = lambda *args, **kwargs: attempts.append(1) or original(*args, **kwargs)
+    with pytest.raises(requests.ConnectionError):
+        x.post_tweet("hello")
+    assert len(attempts) == x.tweets.max_attempts
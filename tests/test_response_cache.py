@@ -0,0 +1,31 @@
+import sqlite3
+
+from db_operations import DBOperations
+from response_cache import ResponseCache
+
+
+def test_cache_and_tweet_queue_share_a_file(tmp_path):
+    path = str(tmp_path / "tweets.db")
+    # The cache sets up its table first; the queue's migrations must still run
+    cache = ResponseCache(db_name=path)
+    db = DBOperations(path)
+    db.connect()
+    db.add_tweet("Self-custody is a habit, not a feature. #Privacy")
+    db.close()
+
+    conn = sqlite3.connect(path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'tweets', 'response_cache', 'schedule_state'} <= tables
+    conn.close()
+
+    key = cache.make_key("gpt-4o-mini", [{'role': 'user', 'content': 'hi'}])
+    cache.set('hashtags', key, ['#Privacy'])
+    assert ResponseCache(db_name=path).get(key) == ['#Privacy']
+
+
+def test_stats_count_hits_and_misses():
+    cache = ResponseCache()
+    cache.set('hashtags', 'a', ['#Privacy'])
+    cache.get('a')
+    cache.get('b')
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 1, 'hit_rate': 0.5}
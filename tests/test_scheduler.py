@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import pytest
+
+from db_operations import DBOperations
+from scheduler import Scheduler
+
+
+def store(path):
+    db = DBOperations(str(path))
+    db.connect()
+    return db
+
+
+def run_for(scheduler, seconds):
+    async def main():
+        runner = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(seconds)
+        scheduler.stop()
+        await runner
+    asyncio.run(main())
+
+
+def counting(runs, name, duration=0.0):
+    async def action():
+        runs.append(name)
+        if duration:
+            await asyncio.sleep(duration)
+    return action
+
+
+def test_next_run_is_persisted_and_resumed(tmp_path):
+    db = store(tmp_path / "tweets.db")
+    runs = []
+    scheduler = Scheduler(store=db)
+    scheduler.add("post", counting(runs, "post"), interval=100)
+    run_for(scheduler, 0.1)
+    assert runs == ["post"]
+    saved = db.load_schedule()["post"]
+    assert saved == pytest.approx(time.time() + 100, abs=5)
+
+    # A restart before the saved slot waits for it instead of running again
+    restarted = Scheduler(store=db)
+    restarted.add("post", counting(runs, "post"), interval=100)
+    run_for(restarted, 0.1)
+    assert runs == ["post"]
+    assert db.load_schedule()["post"] == saved
+    db.close()
+
+
+@pytest.mark.parametrize("policy, expected_runs", [("skip", 0), ("run_once", 1), ("catch_up", 3)])
+def test_missed_runs_follow_policy(tmp_path, policy, expected_runs):
+    db = store(tmp_path / "tweets.db")
+    # Stopped for 2.5 intervals: three slots fell due (the saved one and two more)
+    db.save_schedule("post", next_run=time.time() - 250)
+    runs = []
+    scheduler = Scheduler(store=db)
+    scheduler.add("post", counting(runs, "post"), interval=100, missed=policy)
+    run_for(scheduler, 0.2)
+    assert len(runs) == expected_runs
+    next_run = db.load_schedule()["post"]
+    if policy == "skip":
+        # The next unmissed slot on the original cadence
+        assert next_run == pytest.approx(time.time() + 50, abs=5)
+    else:
+        assert next_run == pytest.approx(time.time() + 100, abs=5)
+    db.close()
+
+
+def test_catch_up_is_capped(tmp_path):
+    db = store(tmp_path / "tweets.db")
+    db.save_schedule("post", next_run=time.time() - 1000)
+    runs = []
+    scheduler = Scheduler(store=db)
+    scheduler.add("post", counting(runs, "post"), interval=100, missed="catch_up", max_catch_up=2)
+    run_for(scheduler, 0.2)
+    assert len(runs) == 3
+    db.close()
+
+
+def test_run_is_skipped_while_previous_still_running():
+    runs = []
+    scheduler = Scheduler()
+    scheduler.add("slow", counting(runs, "slow", duration=0.35), interval=0.1)
+    run_for(scheduler, 0.5)
+    # Slots at ~0.1, 0.2 and 0.3s fall inside the first run and are skipped
+    assert len(runs) == 2
+    assert scheduler.tasks["slow"].running == 0
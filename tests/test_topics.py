@@ -0,0 +1,24 @@
+from topics import TopicTracker
+
+THEMES = [
+    "Cybersecurity and privacy: Safeguarding individual rights in a digital age",
+    "Gaming technology: Pioneering new frontiers in immersive experiences",
+    "Open-source software as a catalyst for technological and societal change",
+]
+
+
+def test_recent_hashtags_lower_matching_theme_weights(tmp_path):
+    topics = TopicTracker(str(tmp_path / "tweets.db"))
+    assert topics.theme_weights(THEMES) == [1.0, 1.0, 1.0]
+
+    for _ in range(3):
+        topics.record_tweet("Your keys, your data. #Privacy #OpenSource")
+    privacy, gaming, open_source = topics.theme_weights(THEMES)
+    assert gaming == 1.0
+    assert privacy < gaming
+    assert open_source < gaming
+
+    # Using the theme itself counts fully, on top of its hashtags
+    topics.record('theme', [THEMES[0]])
+    assert topics.theme_weights(THEMES)[0] < privacy
+    topics.db.close()
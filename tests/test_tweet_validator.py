@@ -0,0 +1,40 @@
+import pytest
+
+from tweet_validator import URL_LENGTH, fit, validate, weighted_length
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("hello", 5),
+    ("\U0001F1FA\U0001F1F8", 2),  # flag: two regional indicators
+    ("Go \U0001F1FA\U0001F1F8\U0001F1EC\U0001F1E7!", 8),
+    ("\U0001F3F4\U000E0067\U000E0062\U000E0065\U000E006E\U000E0067\U000E007F", 2),  # subdivision flag
+    ("\U0001F468‍\U0001F469‍\U0001F467", 2),  # ZWJ family
+    ("\U0001F44D\U0001F3FD", 2),  # skin tone
+    ("1️⃣", 2),  # keycap
+    ("©️", 2),
+    ("©", 1),
+    ("日本", 4),
+])
+def test_emoji_and_wide_characters(text, expected):
+    assert weighted_length(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("https://example.com/a/very/long/path?with=query", URL_LENGTH),
+    ("example.com/x", URL_LENGTH),
+    ("see example.com", 4 + URL_LENGTH),
+    ("docs at sub.example.org/guide.", 8 + URL_LENGTH),
+    ("bit.ly/abc", URL_LENGTH),
+    ("getmonero.org", URL_LENGTH),
+    ("Node.js and README.md", 21),
+    ("mail me@example.com", 8 + len("example.com")),
+])
+def test_urls_weigh_as_tco_links(text, expected):
+    assert weighted_length(text) == expected
+
+
+def test_flags_fit_within_limit():
+    text = "Worldwide " + "\U0001F1FA\U0001F1F8" * 135
+    assert weighted_length(text) == 280
+    assert validate(text, 280) is None
+    assert fit(text, 280) == text
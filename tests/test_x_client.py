@@ -0,0 +1,133 @@
+import io
+import itertools
+import random
+import re
+import threading
+import time
+
+import pytest
+import requests
+
+from x_client import HOST_CONNECTIONS, MediaProcessingError, XClient, shared_session
+
+names = itertools.count()
+
+
+def client(url, **options):
+    x = XClient(None, name=f"test{next(names)}", **options)
+    x.tweet_url = f"{url}/2/tweets"
+    x.upload_url = f"{url}/1.1/media/upload.json"
+    for endpoint in (x.tweets, x.media, x.media_append):
+        endpoint.bucket.rate = endpoint.bucket.tokens = endpoint.bucket.capacity = 1000
+        endpoint.base_delay = 0.01
+    return x
+
+
+def test_shared_session_reuses_one_connection(fake_server):
+    fake_server.handler = lambda method, path, body: (201, {'data': {'id': '1'}})
+    # Two accounts on the process-wide pool share the same keep-alive connection
+    first, second = client(fake_server.url), client(fake_server.url)
+    assert first.session is second.session is shared_session()
+    for _ in range(10):
+        assert first.post_tweet("hello").status_code == 201
+        assert second.post_tweet("hello").status_code == 201
+    assert len(fake_server.requests) == 20
+    assert fake_server.connections == 1
+
+
+def test_concurrent_requests_stay_within_pool(fake_server):
+    fake_server.handler = lambda method, path, body: (201, {'data': {'id': '1'}})
+    fake_server.delay = 0.05
+    x = client(fake_server.url)
+    threads = [threading.Thread(target=x.post_tweet, args=("hello",)) for _ in range(HOST_CONNECTIONS * 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(fake_server.requests) == HOST_CONNECTIONS * 3
+    assert fake_server.connections <= HOST_CONNECTIONS
+
+
+class FakeUpload:
+    # Answers INIT/APPEND/FINALIZE/STATUS like upload.twitter.com
+    def __init__(self, fail_segments=None, processing=None):
+        self.fail_segments = fail_segments or {}  # segment -> list of statuses to answer first
+        self.processing = processing  # processing_info states returned in order; the last repeats
+        self.commands = []
+        self.segments = {}
+
+    def __call__(self, method, path, body):
+        if method == 'GET':
+            self.commands.append('STATUS')
+            state = self.processing.pop(0) if len(self.processing) > 1 else self.processing[0]
+            return 200, {'processing_info': {'state': state, 'check_after_secs': 0}}
+        command = re.search(rb'command(?:=|"\r\n\r\n)(\w+)', body).group(1).decode()
+        self.commands.append(command)
+        if command == 'INIT':
+            return 200, {'media_id_string': '42'}
+        if command == 'APPEND':
+            segment = int(re.search(rb'name="segment_index"\r\n\r\n(\d+)', body).group(1))
+            failures = self.fail_segments.get(segment)
+            if failures:
+                return failures.pop(0), {}
+            data = body.split(b'filename="media"', 1)[1].split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n--', 1)[0]
+            self.segments[segment] = data
+            return 204, {}
+        info = {'state': self.processing[0], 'check_after_secs': 0} if self.processing else None
+        return 200, {'media_id_string': '42', 'processing_info': info} if info else {'media_id_string': '42'}
+
+
+def payload(size=10 * 1024):
+    return bytes(random.Random(1).getrandbits(8) for _ in range(size))
+
+
+def test_chunked_upload_retries_only_the_failed_segment(fake_server):
+    upload = FakeUpload(fail_segments={2: [503, 503]})
+    fake_server.handler = upload
+    data = payload()
+    x = client(fake_server.url, chunk_size=1024)
+    assert x.upload_media(io.BytesIO(data), len(data), 'image/png') == '42'
+    appends = [c for c in upload.commands if c == 'APPEND']
+    assert len(appends) == 12  # ten segments plus two retries of segment 2
+    assert b''.join(upload.segments[i] for i in range(10)) == data
+    assert upload.commands[0] == 'INIT' and upload.commands[-1] == 'FINALIZE'
+
+
+def test_chunked_upload_resumes_from_state(fake_server):
+    upload = FakeUpload(fail_segments={6: [400]})
+    fake_server.handler = upload
+    data = payload()
+    x = client(fake_server.url, chunk_size=1024)
+    state = {}
+    with pytest.raises(requests.HTTPError):
+        x.upload_media(io.BytesIO(data), len(data), 'image/png', state)
+    assert state == {'media_id': '42', 'segment': 6}
+
+    upload.commands.clear()
+    assert x.upload_media(io.BytesIO(data), len(data), 'image/png', state) == '42'
+    assert upload.commands == ['APPEND'] * 4 + ['FINALIZE']
+    assert b''.join(upload.segments[i] for i in range(10)) == data
+
+    # A finished upload is reused without another request
+    upload.commands.clear()
+    assert x.upload_media(io.BytesIO(data), len(data), 'image/png', state) == '42'
+    assert upload.commands == []
+
+
+def test_processing_poll_gives_up_after_timeout(fake_server):
+    fake_server.handler = FakeUpload(processing=['in_progress'])
+    x = client(fake_server.url, processing_timeout=0.3)
+    start = time.monotonic()
+    with pytest.raises(MediaProcessingError):
+        x.upload_media(io.BytesIO(b'gif'), 3, 'image/gif')
+    assert time.monotonic() - start < 2
+
+
+def test_failed_processing_clears_state(fake_server):
+    fake_server.handler = FakeUpload(processing=['pending', 'failed'])
+    x = client(fake_server.url)
+    state = {'started': 1.0}
+    with pytest.raises(MediaProcessingError):
+        x.upload_media(io.BytesIO(b'video'), 5, 'video/mp4', state)
+    # Only the upload's own keys go; the caller's bookkeeping stays
+    assert state == {'started': 1.0}
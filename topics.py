@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import time
+
+from db_operations import DBOperations
+from hashtags import joined_terms
+
+
+class TopicTracker:
+    """Theme and hashtag usage history in the database, plus a theme scheduler.
+
+    Each (kind, name) row keeps a use count and an exponentially decayed
+    usage score (half-life `half_life` seconds), updated in place on every
+    use. Themes are picked at random with weight 1 / (1 + usage), where usage
+    is the theme's decayed score plus hashtag_weight times the scores of the
+    `hashtag_window` most recent hashtags that name one of its words (#Privacy
+    counts against "Cybersecurity and privacy"), so topics used often or
+    recently are less likely but never excluded. Both the bot and the review
+    console can update it concurrently.
+    """
+
+    def __init__(self, db_name='tweets.db', half_life=3 * 86400, hashtag_weight=0.5, hashtag_window=50):
+        self.db = DBOperations(db_name)
+        self.half_life = half_life
+        self.hashtag_weight = hashtag_weight
+        self.hashtag_window = hashtag_window
+
+    def decayed(self, score, last_used, now):
+        return score * 0.5 ** ((now - last_used) / self.half_life)
+
+    def record(self, kind, names):
+        self.db.connect()
+        conn = self.db.conn
+        now = time.time()
+        try:
+            conn.commit()
+            # Take the write lock before reading so concurrent updates can't be lost
+            conn.execute("BEGIN IMMEDIATE")
+            for name in names:
+                row = conn.execute("SELECT score, last_used FROM topic_usage WHERE kind = ? AND name = ?",
+                                   (kind, name)).fetchone()
+                score = self.decayed(row[0], row[1], now) + 1 if row else 1.0
+                conn.execute("""
+                    INSERT INTO topic_usage (kind, name, uses, score, last_used) VALUES (?, ?, 1, ?, ?)
+                    ON CONFLICT (kind, name) DO UPDATE SET uses = uses + 1, score = excluded.score,
+                                                           last_used = excluded.last_used
+                """, (kind, name, score, now))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logging.error(f"Error recording topic usage: {e}")
+
+    def record_tweet(self, tweet, theme=None):
+        if theme:
+            self.record('theme', [theme])
+        hashtags = list(dict.fromkeys(re.findall(r'#(\w+)', tweet)))
+        if hashtags:
+            self.record('hashtag', hashtags)
+
+    def recent(self, kind='hashtag', limit=10):
+        self.db.connect()
+        rows = self.db.conn.execute(
+            "SELECT name FROM topic_usage WHERE kind = ? ORDER BY last_used DESC LIMIT ?", (kind, limit)).fetchall()
+        return [row[0] for row in rows]
+
+    def scores(self, kind, names):
+        self.db.connect()
+        now = time.time()
+        placeholders = ', '.join('?' for _ in names)
+        rows = self.db.conn.execute(
+            f"SELECT name, score, last_used FROM topic_usage WHERE kind = ? AND name IN ({placeholders})",
+            [kind] + list(names)).fetchall()
+        return {name: self.decayed(score, last_used, now) for name, score, last_used in rows}
+
+    def recent_scores(self, kind, limit):
+        self.db.connect()
+        now = time.time()
+        rows = self.db.conn.execute(
+            "SELECT name, score, last_used FROM topic_usage WHERE kind = ? ORDER BY last_used DESC LIMIT ?",
+            (kind, limit)).fetchall()
+        scores = {}
+        for name, score, last_used in rows:
+            scores[name.lower()] = scores.get(name.lower(), 0.0) + self.decayed(score, last_used, now)
+        return scores
+
+    def theme_weights(self, themes):
+        scores = self.scores('theme', themes)
+        hashtags = self.recent_scores('hashtag', self.hashtag_window)
+        weights = []
+        for theme in themes:
+            words = joined_terms(theme)
+            overlap = sum(score for tag, score in hashtags.items() if tag in words)
+            weights.append(1 / (1 + scores.get(theme, 0.0) + self.hashtag_weight * overlap))
+        return weights
+
+    def choose_theme(self, themes):
+        if not themes:
+            return None
+        return random.choices(themes, weights=self.theme_weights(themes))[0]
+
+    def import_legacy_file(self, path):
+        # One-off import of the old recent_topics.json list (oldest first)
+        if not os.path.exists(path) or self.recent('hashtag', 1):
+            return
+        try:
+            with open(path, 'r') as f:
+                topics = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error reading {path}: {e}")
+            return
+        for topic in topics:
+            if topic != "Unknown":
+                self.record('hashtag', [topic])
+        logging.info(f"Imported {len(topics)} recent topics from {path}")
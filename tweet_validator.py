@@ -0,0 +1,147 @@
+import bisect
+import os
+import re
+
+# X's weighted length rules (twitter-text v3 config): code points in these
+# ranges weigh 1, everything else (CJK, most symbols) weighs 2, every URL
+# counts as a 23-character t.co link and each emoji grapheme (flag, keycap,
+# ZWJ sequence, modified emoji) weighs 2.
+# Limits are in weight units, i.e. "characters" as X shows them.
+LIGHT_RANGES = [(0x0000, 0x10FF), (0x2000, 0x200D), (0x2010, 0x201F), (0x2032, 0x2037)]
+LIGHT_STARTS = [start for start, _ in LIGHT_RANGES]
+URL_LENGTH = 23
+MAX_WEIGHTED_LENGTH = int(os.getenv('MAX_TWEET_LENGTH', '2000'))
+
+# X also links bare domains: always for generic TLDs, and for two-letter
+# country TLDs only when a path follows (so "README.md" stays text)
+GENERIC_TLDS = ('com|net|org|edu|gov|mil|int|info|biz|xyz|app|dev|tech|online|site|blog|news|io|ai|co|me|ly|gg|'
+                'tv|fm|sh')
+URL_PATTERN = re.compile(
+    r'https?://[^\s]+'
+    r'|(?<![\w@./-])(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+'
+    rf'(?:(?:{GENERIC_TLDS})(?![\w-])(?:/[^\s]*)?|[a-z]{{2}}/[^\s]*)',
+    re.IGNORECASE)
+TRAILING_HASHTAGS = re.compile(r'(\s+#\w+)+\s*$')
+SENTENCE_END = re.compile(r'[.!?…](?=\s)')
+
+ZWJ = 0x200D
+KEYCAP = 0x20E3
+VARIATION_SELECTORS = {0xFE0E, 0xFE0F}
+EMOJI_MODIFIERS = VARIATION_SELECTORS | set(range(0x1F3FB, 0x1F400))
+
+
+def is_emoji(cp):
+    return (0x1F000 <= cp <= 0x1FAFF or 0x2600 <= cp <= 0x27BF or 0x2B00 <= cp <= 0x2BFF
+            or 0x1F1E6 <= cp <= 0x1F1FF)
+
+
+def is_regional_indicator(cp):
+    return 0x1F1E6 <= cp <= 0x1F1FF
+
+
+def char_weight(cp):
+    i = bisect.bisect_right(LIGHT_STARTS, cp) - 1
+    return 1 if i >= 0 and cp <= LIGHT_RANGES[i][1] else 2
+
+
+def emoji_end(text, start):
+    # Index just past the emoji grapheme starting at start: the base plus any
+    # variation selectors, skin tones, keycap mark, tag characters (subdivision
+    # flags) and further emoji joined with ZWJ; a flag is a pair of regional
+    # indicators
+    if is_regional_indicator(ord(text[start])):
+        pair = start + 1 < len(text) and is_regional_indicator(ord(text[start + 1]))
+        return start + 2 if pair else start + 1
+    end = start + 1
+    while end < len(text):
+        cp = ord(text[end])
+        if cp in EMOJI_MODIFIERS or cp == KEYCAP or 0xE0020 <= cp <= 0xE007F:
+            end += 1
+        elif cp == ZWJ and end + 1 < len(text) and is_emoji(ord(text[end + 1])):
+            end += 2
+        else:
+            break
+    return end
+
+
+def starts_emoji(text, i):
+    # An emoji code point, or a character given emoji presentation (©️, 1️⃣)
+    if is_emoji(ord(text[i])):
+        return True
+    following = ord(text[i + 1]) if i + 1 < len(text) else None
+    return following in (0xFE0F, KEYCAP)
+
+
+def _text_weight(text):
+    weight = 0
+    i = 0
+    while i < len(text):
+        cp = ord(text[i])
+        if cp in EMOJI_MODIFIERS or cp == ZWJ:
+            # Stray modifier with nothing to attach to
+            i += 1
+        elif starts_emoji(text, i):
+            weight += 2
+            i = emoji_end(text, i)
+        else:
+            weight += char_weight(cp)
+            i += 1
+    return weight
+
+
+def weighted_length(text):
+    weight = 0
+    position = 0
+    for match in URL_PATTERN.finditer(text):
+        weight += _text_weight(text[position:match.start()]) + URL_LENGTH
+        position = match.end()
+    return weight + _text_weight(text[position:])
+
+
+def validate(text, max_length=MAX_WEIGHTED_LENGTH):
+    # Returns None if the tweet can be posted, otherwise the reason it can't
+    if not text or not text.strip():
+        return "tweet is empty"
+    length = weighted_length(text)
+    if length > max_length:
+        return f"tweet is {length} weighted characters, over the {max_length} limit"
+    return None
+
+
+def fit(text, max_length=MAX_WEIGHTED_LENGTH):
+    """Truncates text to max_length weighted characters.
+
+    Trailing hashtags are kept; the body is cut at the last sentence end that
+    fits, or failing that at a word boundary with an ellipsis.
+    """
+    text = text.strip()
+    if weighted_length(text) <= max_length:
+        return text
+    match = TRAILING_HASHTAGS.search(text)
+    body, tags = (text[:match.start()], match.group(0).strip()) if match else (text, '')
+    suffix = f" {tags}" if tags else ''
+    budget = max_length - weighted_length(suffix)
+    if budget <= 0:
+        # Hashtags alone don't fit; fall back to fitting the whole text
+        body, suffix, budget = text, '', max_length
+
+    # Longest prefix that fits, found by binary search over character offsets
+    low, high = 0, len(body)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if weighted_length(body[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = body[:low]
+
+    sentences = [m.end() for m in SENTENCE_END.finditer(prefix + ' ')]
+    if sentences and sentences[-1] > len(prefix) // 2:
+        cut = prefix[:sentences[-1]].rstrip()
+    else:
+        ellipsis_budget = budget - weighted_length('...')
+        while prefix and weighted_length(prefix) > ellipsis_budget:
+            prefix = prefix[:-1]
+        space = prefix.rfind(' ')
+        cut = (prefix[:space] if space > 0 else prefix).rstrip(' ,;:-') + '...'
+    return cut + suffix
@@ -0,0 +1,225 @@
+import os
+import tempfile
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from requests_oauthlib import OAuth1
+
+from resilience import env_rate, get_endpoint
+
+# (connect, read) timeouts in seconds for every X and media request
+TIMEOUT = (float(os.getenv('X_CONNECT_TIMEOUT', '5')), float(os.getenv('X_READ_TIMEOUT', '30')))
+# Most keep-alive connections open to any one host; further requests wait for a free one
+HOST_CONNECTIONS = int(os.getenv('X_HOST_CONNECTIONS', '8'))
+# Media is streamed in DOWNLOAD_CHUNK pieces into a temp file that stays in
+# memory up to SPOOL_MEMORY bytes, then uploaded in UPLOAD_CHUNK segments
+# (X accepts up to 5 MB per APPEND)
+DOWNLOAD_CHUNK = 64 * 1024
+SPOOL_MEMORY = int(os.getenv('MEDIA_SPOOL_MEMORY', str(1024 * 1024)))
+UPLOAD_CHUNK = int(os.getenv('X_UPLOAD_CHUNK', str(4 * 1024 * 1024)))
+# Longest wait for X to finish processing an upload (video, GIFs)
+PROCESSING_TIMEOUT = float(os.getenv('X_MEDIA_PROCESSING_TIMEOUT', '300'))
+# Keys upload_media keeps in a caller's resume state; callers may add their own
+UPLOAD_STATE_KEYS = ('media_id', 'segment', 'finalized', 'processing', 'processed')
+
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+
+image_download = get_endpoint("openai.image_download", rate=env_rate("openai.image_download", 1.0), capacity=5,
+                              transient_errors=TRANSIENT_ERRORS)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def shared_session():
+    # One connection pool per host for the whole process, so every account
+    # reuses the same TCP+TLS connections to api.twitter.com and upload.twitter.com
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HOST_CONNECTIONS, pool_block=True)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # Requests are signed with OAuth1; cookies would only leak between accounts
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _session = session
+        return _session
+
+
+class MediaProcessingError(requests.RequestException):
+    pass
+
+
+class ConnectError(requests.ConnectionError):
+    # The connection could not be opened, so the request was never sent
+    pass
+
+
+def send(method, *args, **kwargs):
+    # Calls a session method, raising ConnectError when it failed before
+    # anything was sent; other connection errors and timeouts leave the
+    # outcome unknown
+    try:
+        return method(*args, **kwargs)
+    except requests.ConnectionError as e:
+        reason = getattr(e.args[0], 'reason', None) if e.args else None
+        if isinstance(e, requests.ConnectTimeout) or isinstance(reason, urllib3.exceptions.NewConnectionError):
+            raise ConnectError(*e.args, request=e.request, response=e.response) from e
+        raise
+
+
+def media_category(media_type):
+    if media_type.startswith('video/'):
+        return 'tweet_video'
+    return 'tweet_gif' if media_type == 'image/gif' else 'tweet_image'
+
+
+class XClient:
+    """X API access for one account over the shared keep-alive pool.
+
+    Holds the account's OAuth1 signer and its own rate limits, retries and
+    circuit breakers (X limits are per user). Methods raise CircuitOpenError
+    or requests.RequestException on failure.
+    """
+
+    tweet_url = "https://api.twitter.com/2/tweets"
+    upload_url = "https://upload.twitter.com/1.1/media/upload.json"
+
+    def __init__(self, auth, name='default', session=None, timeout=TIMEOUT, chunk_size=UPLOAD_CHUNK,
+                 processing_timeout=PROCESSING_TIMEOUT):
+        self.auth = auth
+        self.name = name
+        self.session = session or shared_session()
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.processing_timeout = processing_timeout
+        # Creating a tweet isn't idempotent: a 5xx or read timeout may still
+        # have published it, so only unsent requests and 429s are retried and
+        # the posting lease settles the rest
+        self.tweets = get_endpoint(f"x.tweets.{name}", rate=env_rate("x.tweets", 1 / 60), capacity=3,
+                                   transient_errors=TRANSIENT_ERRORS, idempotent=False,
+                                   unsent_errors=(ConnectError,))
+        self.media = get_endpoint(f"x.media.{name}", rate=env_rate("x.media", 1 / 10), capacity=3,
+                                  transient_errors=TRANSIENT_ERRORS)
+        # APPEND segments have a much higher allowance than INIT/FINALIZE
+        self.media_append = get_endpoint(f"x.media_append.{name}", rate=env_rate("x.media_append", 1.0),
+                                         capacity=10, transient_errors=TRANSIENT_ERRORS)
+
+    @classmethod
+    def from_env(cls, prefix='X_', name='default'):
+        # Credentials from {prefix}API_KEY, {prefix}API_SECRET, {prefix}ACCESS_TOKEN, {prefix}ACCESS_TOKEN_SECRET
+        auth = OAuth1(os.getenv(f'{prefix}API_KEY'), os.getenv(f'{prefix}API_SECRET'),
+                      os.getenv(f'{prefix}ACCESS_TOKEN'), os.getenv(f'{prefix}ACCESS_TOKEN_SECRET'))
+        return cls(auth, name)
+
+    def post_tweet(self, text, media_ids=None):
+        payload = {"text": text}
+        if media_ids:
+            payload["media"] = {"media_ids": list(media_ids)}
+        return self.tweets.call(lambda: send(self.session.post, self.tweet_url, json=payload, auth=self.auth,
+                                             timeout=self.timeout))
+
+    def _media_command(self, endpoint, data, files=None):
+        response = endpoint.call(lambda: self.session.post(self.upload_url, data=data, files=files, auth=self.auth,
+                                                           timeout=self.timeout))
+        response.raise_for_status()
+        return response
+
+    def media_status(self, media_id):
+        response = self.media.call(lambda: self.session.get(
+            self.upload_url, params={'command': 'STATUS', 'media_id': media_id}, auth=self.auth,
+            timeout=self.timeout))
+        response.raise_for_status()
+        return response.json().get('processing_info')
+
+    def upload_media(self, file, total_bytes, media_type, state=None):
+        """Uploads a file object with the chunked INIT/APPEND/FINALIZE flow.
+
+        Only one segment is held in memory at a time, and each segment is
+        retried on its own. state records the media_id, the number of
+        segments already appended and whether FINALIZE was sent; pass the same
+        dict again after a failure to resume from the first missing step (a
+        finished upload just returns its media_id). If X reports processing
+        failed the upload's keys are removed from state (any others are left
+        alone), so the next call starts over. Raises
+        MediaProcessingError if processing fails or takes longer than
+        processing_timeout. Returns the media_id string.
+        """
+        state = {} if state is None else state
+        if 'media_id' not in state:
+            response = self._media_command(self.media, {
+                'command': 'INIT', 'total_bytes': total_bytes, 'media_type': media_type,
+                'media_category': media_category(media_type),
+            })
+            state['media_id'] = response.json()['media_id_string']
+            state['segment'] = 0
+        media_id = state['media_id']
+
+        file.seek(state['segment'] * self.chunk_size)
+        while True:
+            chunk = file.read(self.chunk_size)
+            if not chunk:
+                break
+            self._media_command(self.media_append,
+                                {'command': 'APPEND', 'media_id': media_id, 'segment_index': state['segment']},
+                                files={'media': chunk})
+            state['segment'] += 1
+
+        if not state.get('finalized'):
+            response = self._media_command(self.media, {'command': 'FINALIZE', 'media_id': media_id})
+            processing = response.json().get('processing_info')
+            state['finalized'] = True
+            state['processing'] = processing is not None
+        elif state['processing'] and not state.get('processed'):
+            processing = self.media_status(media_id)
+        else:
+            return media_id
+
+        # Video and GIFs are processed asynchronously; images usually aren't
+        deadline = time.monotonic() + self.processing_timeout
+        while processing and processing.get('state') in ('pending', 'in_progress'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise MediaProcessingError(f"Media {media_id} still processing after {self.processing_timeout:.0f}s")
+            time.sleep(min(processing.get('check_after_secs', 1), remaining))
+            processing = self.media_status(media_id)
+        if processing and processing.get('state') == 'failed':
+            for key in UPLOAD_STATE_KEYS:
+                state.pop(key, None)
+            raise MediaProcessingError(f"Media {media_id} failed processing: {processing.get('error')}")
+        state['processed'] = True
+        return media_id
+
+    def download(self, url):
+        """Streams url into a spooled temp file.
+
+        Returns (file, size, media_type) with the file rewound; the caller
+        closes it. Memory use stays under SPOOL_MEMORY regardless of size.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY)
+
+        def fetch():
+            spool.seek(0)
+            spool.truncate()
+            response = self.session.get(url, stream=True, timeout=self.timeout)
+            with response:
+                if response.status_code == 200:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                        spool.write(chunk)
+            return response
+
+        try:
+            response = image_download.call(fetch)
+            response.raise_for_status()
+        except Exception:
+            spool.close()
+            raise
+        size = spool.tell()
+        spool.seek(0)
+        media_type = response.headers.get('content-type', 'image/png').split(';')[0].strip()
+        return spool, size, media_type